@@ -0,0 +1,179 @@
+"""Audio engines - what Model plays its clips through.
+
+An engine opens its output once, knows every clip by name (as in
+conversations.json and persons.json) and keeps a Channel per role.
+Model only uses the Channel calls below, so which engine is behind them
+is picked at start up with SB_AUDIO_ENGINE:
+
+    vlc   libVLC, decodes each clip as it plays (vlcaudio.py)
+    pcm   clips decoded up front, one ALSA stream always open (pcmaudio.py)
+    null  as pcm, but written to a file or nowhere, for running headless
+"""
+import time
+
+import settings
+
+# Channels kept per role. Two voice channels, so the next clip can be
+# loaded and waiting on one while the ring tone plays.
+ROLES = {'buzzer': 1, 'tone': 1, 'voice': 2}
+
+
+def rssKb():
+    """Resident set size of this process, 0 where /proc isn't available"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class Channel:
+    """Plays one clip at a time.
+
+    What to do when a clip ends is given to play() as `then`, and called
+    on the main thread by dispatch.Dispatcher. Every play() and stop()
+    starts a new token, so an end that arrives after the channel has
+    moved on is known to be stale and dropped.
+
+    Engines call _playing() and _ended() from their own thread as audio
+    starts and runs out, _ended() with the token the play that ended was
+    started with. Playing callbacks run right there, as
+    `callback(event, *args)` like VLC's event manager. The clip's
+    time.monotonic() is kept in playingAt and endedAt.
+    """
+
+    def __init__(self):
+        self.clip = None
+        self.paused = False
+        self.playingAt = None
+        self.endedAt = None
+        self.token = 0
+        # Continuation for the clip with this token
+        self.then = None
+        self._chain = None
+        self._post = None
+        self._playingCallbacks = []
+
+    def _begin(self, then=None, chain=None):
+        self.token += 1
+        self.then = then
+        self._chain = chain
+
+    def load(self, name):
+        """Set the clip the next play() starts"""
+        raise NotImplementedError
+
+    def play(self, then=None, chain=None):
+        """Start the loaded clip. `then()` is called on the main thread once
+        it's played through. `chain`, a channel with a clip cue()d, is
+        resumed the moment it ends, without waiting for the main thread."""
+        raise NotImplementedError
+
+    def cue(self, name):
+        """Load a clip and get it ready to start, paused, so resume()
+        has nothing left to open or decode"""
+        raise NotImplementedError
+
+    def resume(self, then=None):
+        """Start a cue()d clip, if it's not already been chained into,
+        and give it its continuation"""
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def cancel(self):
+        """Drop the continuation and chain, leave the clip playing"""
+        self.then = None
+        self._chain = None
+
+    def timeMs(self):
+        """Position in the clip, -1 when stopped"""
+        raise NotImplementedError
+
+    def postEndsTo(self, post):
+        """`post(channel, event, token)` for every end, from the engine's thread"""
+        self._post = post
+
+    def onPlaying(self, callback, *args):
+        """Called whenever audio actually starts, stays attached"""
+        self._playingCallbacks.append((callback, args))
+
+    def _playing(self, event):
+        self.playingAt = time.monotonic()
+        for callback, args in self._playingCallbacks:
+            callback(event, *args)
+
+    def _resumeChain(self, chain):
+        """From _ended(), on the engine's thread. Engines that can't be
+        called back into from there hand it on."""
+        chain.resume()
+
+    def _ended(self, event, token):
+        """`token` is the one the play that ended was started with, as the
+        channel's own may have moved on by the time the engine says so"""
+        self.endedAt = time.monotonic()
+        chain = self._chain
+        if chain is not None and token == self.token:
+            self._resumeChain(chain)
+        if self._post is not None:
+            self._post(self, event, token)
+
+
+class AudioEngine:
+    """A Channel per role in ROLES, plus start up costs for the stats"""
+    name = None
+
+    def __init__(self):
+        self._channels = {}
+        self.startupMs = 0.0
+
+    def _addChannels(self, newChannel):
+        for role, count in ROLES.items():
+            for _ in range(count):
+                self._channels.setdefault(role, []).append(newChannel(role))
+
+    def channel(self, role, index=0):
+        return self._channels[role][index]
+
+    def channels(self):
+        return [channel for roleChannels in self._channels.values() for channel in roleChannels]
+
+    def stopAll(self):
+        for channel in self.channels():
+            channel.stop()
+
+    def close(self):
+        self.stopAll()
+
+    def summary(self):
+        return (f"-- Audio: {self.name} engine, {len(self.channels())} channels, "
+                f"started in {self.startupMs:.1f} ms, RSS now {rssKb()} kB --")
+
+
+def _pcmCache():
+    if not settings.PCM_CACHE_DIR:
+        return None
+    from pcmcache import PcmCache
+    return PcmCache(settings.PCM_CACHE_DIR, settings.PCM_CACHE_MB << 20)
+
+
+def createEngine(name, audioDir, names=()):
+    # Import here so only the engine in use needs its libraries
+    started = time.monotonic()
+    if name == 'vlc':
+        from vlcaudio import VlcEngine
+        engine = VlcEngine(audioDir, names)
+    elif name == 'pcm':
+        from pcmaudio import AlsaSink, PcmEngine
+        engine = PcmEngine(audioDir, names, AlsaSink(settings.AUDIO_DEVICE), _pcmCache())
+    elif name == 'null':
+        from pcmaudio import NullEngine
+        engine = NullEngine(audioDir, names, settings.AUDIO_SINK_FILE, _pcmCache())
+    else:
+        raise ValueError(f"Unknown audio engine: {name}")
+    engine.startupMs = (time.monotonic() - started) * 1000
+    return engine
@@ -0,0 +1,182 @@
+"""Audio start latency benchmark.
+
+    python bench_audio.py [--engines vlc,pcm] [--rounds 5] [--full]
+
+Runs Model through each way it starts a clip, with no switchboard or
+window, once per engine:
+
+    handleStart         Welcome
+    initiateCall        buzzer
+    playHello           each convo's helloFile
+    playConvo           ring tone, then handlePlayFullConvo's convoFile
+    playWrongNum        ring tone, then handlePlayFullWrongNum's wrongNumFile
+    playRequestCorrect  each convo's retryAfterWrongFile
+
+"start" is from the call to the channel reporting it's playing. "chain"
+is from the end of one clip to the first audio of the clip that follows
+it - ring tone to voice, and with --full wrong number to the request for
+the right one, which means sitting through each wrong number clip.
+Percentiles are reported per engine and path, and per engine and clip.
+Run from the app directory, like control.py.
+"""
+import argparse
+import contextlib
+import io
+import time
+
+from PyQt5 import QtCore as qtc
+
+from audio import createEngine
+from model import Model, conversations, persons
+from sequencer import clipNames
+import settings
+
+
+def percentile(values, pct):
+    """Nearest rank, values already sorted"""
+    index = max(0, min(len(values) - 1, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Bench:
+    def __init__(self, app, engineName, timeoutS, full):
+        self.app = app
+        self.engineName = engineName
+        self.timeoutS = timeoutS
+        self.full = full
+        self.engine = createEngine(engineName, settings.AUDIO_DIR,
+            clipNames(conversations, persons))
+        self.model = Model(self.engine)
+        # (kind, path or clip) -> [ms]
+        self.samples = {}
+        self.timeouts = 0
+
+    def _add(self, kind, path, clip, ms):
+        self.samples.setdefault((kind, 'path', path), []).append(ms)
+        self.samples.setdefault((kind, 'clip', clip), []).append(ms)
+
+    def _waitFor(self, condition):
+        deadline = time.monotonic() + self.timeoutS
+        while not condition():
+            if time.monotonic() > deadline:
+                self.timeouts += 1
+                return False
+            # Audio callbacks get to Model through queued signals
+            self.app.processEvents(qtc.QEventLoop.AllEvents, 5)
+            time.sleep(0.001)
+        return True
+
+    def _playingSince(self, channels, since):
+        """The first of `channels` to start playing after `since`"""
+        for channel in channels:
+            if channel.playingAt is not None and channel.playingAt > since:
+                return channel
+        return None
+
+    def _start(self, path, channels, call):
+        """Time `call()` to first audio on one of `channels`"""
+        calledAt = time.monotonic()
+        call()
+        if not self._waitFor(lambda: self._playingSince(channels, calledAt)):
+            return None
+        channel = self._playingSince(channels, calledAt)
+        self._add('start', path, channel.clip, (channel.playingAt - calledAt) * 1000)
+        return channel
+
+    def _chain(self, path, first, nextChannels):
+        """Time from `first` running out to the next clip's first audio"""
+        if not self._waitFor(lambda: first.endedAt is not None
+                             and first.endedAt > first.playingAt):
+            return None
+        endedAt = first.endedAt
+        if not self._waitFor(lambda: self._playingSince(nextChannels, endedAt)):
+            return None
+        channel = self._playingSince(nextChannels, endedAt)
+        self._add('chain', path, channel.clip, (channel.playingAt - endedAt) * 1000)
+        return channel
+
+    def _reset(self):
+        m = self.model
+        m.detachAllEventHandlers()
+        m.stopAllAudio()
+        m.stopTimers()
+        m.reset()
+        # Let anything already signalled land before the next path
+        self.app.processEvents()
+
+    def run(self, rounds):
+        m = self.model
+        voices = m.voices
+        for _ in range(rounds):
+            self._start('handleStart', voices, m.handleStart)
+            self._reset()
+            for convo, conversation in enumerate(conversations):
+                m.currConvo = convo
+                if convo < 9:
+                    self._start('initiateCall', [m.buzzer], m.initiateCall)
+                    self._reset()
+                if conversation["helloFile"]:
+                    m.currConvo = convo
+                    self._start('playHello', voices, lambda: m.playHello(convo))
+                    self._reset()
+                if conversation["convoFile"]:
+                    m.currConvo = convo
+                    if self._start('playConvo', [m.tone], lambda: m.playConvo(convo)):
+                        self._chain('playConvo', m.tone, voices)
+                    self._reset()
+                if conversation["retryAfterWrongFile"]:
+                    m.currConvo = convo
+                    self._start('playRequestCorrect', voices, m.playRequestCorrect)
+                    self._reset()
+            for person, details in enumerate(persons):
+                if not details["wrongNumFile"]:
+                    continue
+                m.currConvo = 0
+                if self._start('playWrongNum', [m.tone], lambda: m.playWrongNum(person)):
+                    voice = self._chain('playWrongNum', m.tone, voices)
+                    if voice is not None and self.full:
+                        self._chain('playRequestCorrect', voice, voices)
+                self._reset()
+        self.engine.close()
+
+    def report(self):
+        lines = [f"== {self.engineName} engine, started in {self.engine.startupMs:.1f} ms, "
+                 f"{self.timeouts} timeouts =="]
+        for group in ('path', 'clip'):
+            lines.append(f"-- by {group} (ms) --")
+            lines.append(f"{'':<6} {group:<32} {'n':>4} {'p50':>8} {'p90':>8} "
+                         f"{'p99':>8} {'max':>8}")
+            for (kind, byGroup, key), values in sorted(self.samples.items()):
+                if byGroup != group:
+                    continue
+                values = sorted(values)
+                lines.append(f"{kind:<6} {key:<32} {len(values):>4} "
+                             f"{percentile(values, 50):8.1f} {percentile(values, 90):8.1f} "
+                             f"{percentile(values, 99):8.1f} {values[-1]:8.1f}")
+        return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audio start latency per engine")
+    parser.add_argument('--engines', default=settings.AUDIO_ENGINE,
+        help="comma separated: vlc, pcm, null")
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=30,
+        help="seconds to wait for any one clip")
+    parser.add_argument('--full', action='store_true',
+        help="also time wrong number -> request correct, playing each wrong number through")
+    args = parser.parse_args()
+
+    app = qtc.QCoreApplication([])
+    reports = []
+    for engineName in args.engines.split(','):
+        # Model's progress prints would bury the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            bench = Bench(app, engineName, args.timeout, args.full)
+            bench.run(args.rounds)
+        reports.append(bench.report())
+    print("\n\n".join(reports))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""I2C transaction accounting.
+
+Every expander's I2CDevice is wrapped so each transaction is counted
+against the register it starts at and the bus command that made it
+(BusWorker's command name: checkPin, continueCheckPin, setLED, ...).
+Totals are kept since start up, and per second buckets give rolling
+rates and how busy the bus has been over the last few seconds.
+"""
+from collections import deque
+import threading
+import time
+
+import expander
+
+REGISTER_NAMES = {
+    expander.IODIRA: 'IODIR',
+    expander.GPINTENA: 'GPINTEN',
+    expander.DEFVALA: 'DEFVAL',
+    expander.INTCONA: 'INTCON',
+    expander.IOCON: 'IOCON',
+    expander.GPPUA: 'GPPU',
+    expander.INTFA: 'INTF',
+    expander.INTCAPA: 'INTCAP',
+    expander.GPIOA: 'GPIO',
+    expander.OLATA: 'OLAT',
+}
+
+
+class BusProfile:
+    """Transactions, bytes and time per register and per caller.
+
+    `currentCaller()` names whoever is using the bus right now, normally
+    the bus worker's current command.
+    """
+    def __init__(self, currentCaller, windowS=10):
+        self._currentCaller = currentCaller
+        self.windowS = windowS
+        self._lock = threading.Lock()
+        self.startedAt = time.monotonic()
+        # name -> [transactions, bytes, seconds]
+        self.byRegister = {}
+        self.byCaller = {}
+        # (whole second, {caller: [transactions, bytes, seconds]}), newest last
+        self._buckets = deque(maxlen=windowS + 1)
+
+    def record(self, chip, register, nbytes, seconds):
+        caller = self._currentCaller() or 'other'
+        registerName = f"{chip} {REGISTER_NAMES.get(register, hex(register))}"
+        second = int(time.monotonic())
+        with self._lock:
+            for table, key in ((self.byRegister, registerName),
+                               (self.byCaller, caller)):
+                self._add(table, key, nbytes, seconds)
+            if not self._buckets or self._buckets[-1][0] != second:
+                self._buckets.append((second, {}))
+            self._add(self._buckets[-1][1], caller, nbytes, seconds)
+
+    @staticmethod
+    def _add(table, key, nbytes, seconds):
+        entry = table.setdefault(key, [0, 0, 0.0])
+        entry[0] += 1
+        entry[1] += nbytes
+        entry[2] += seconds
+
+    def rates(self):
+        """Per caller (transactions/s, bytes/s, busy %) over the last
+        windowS whole seconds, and the bus busy % overall"""
+        now = int(time.monotonic())
+        span = max(1, min(self.windowS, now - int(self.startedAt)))
+        totals = {}
+        with self._lock:
+            for second, callers in self._buckets:
+                if now - span <= second < now:
+                    for caller, entry in callers.items():
+                        total = totals.setdefault(caller, [0, 0, 0.0])
+                        for i in range(3):
+                            total[i] += entry[i]
+        rates = {caller: (n / span, nbytes / span, 100 * seconds / span)
+                 for caller, (n, nbytes, seconds) in totals.items()}
+        busy = sum(rate[2] for rate in rates.values())
+        return rates, busy
+
+    def summary(self):
+        rates, busy = self.rates()
+        lines = [f"-- I2C bus: {busy:.1f}% busy over the last {self.windowS} s --"]
+        for caller, (n, nbytes, busyPct) in sorted(
+                rates.items(), key=lambda item: -item[1][2]):
+            lines.append(f"{caller:<24} {n:7.1f} tx/s {nbytes:8.1f} B/s "
+                         f"{busyPct:5.1f}% busy")
+        with self._lock:
+            for title, table in (("caller", self.byCaller),
+                                 ("register", self.byRegister)):
+                lines.append(f"-- I2C totals by {title} --")
+                for key, (n, nbytes, seconds) in sorted(
+                        table.items(), key=lambda item: -item[1][2]):
+                    lines.append(f"{key:<24} n={n:<7} {nbytes:>8} B "
+                                 f"{seconds * 1000:9.1f} ms")
+        return "\n".join(lines)
+
+
+class ProfiledI2CDevice:
+    """Stands in for a chip's I2CDevice and reports each transaction"""
+
+    def __init__(self, device, profile, chip):
+        self._device = device
+        self._profile = profile
+        self._chip = chip
+
+    def __enter__(self):
+        self._device.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._device.__exit__(*exc)
+
+    def write(self, buf, start=0, end=None):
+        started = time.perf_counter()
+        self._device.write(buf, start=start, end=end)
+        end = len(buf) if end is None else end
+        self._profile.record(self._chip, buf[start], end - start,
+                             time.perf_counter() - started)
+
+    def write_then_readinto(self, out_buffer, in_buffer, out_start=0,
+                            out_end=None, in_start=0, in_end=None):
+        started = time.perf_counter()
+        self._device.write_then_readinto(out_buffer, in_buffer,
+            out_start=out_start, out_end=out_end,
+            in_start=in_start, in_end=in_end)
+        out_end = len(out_buffer) if out_end is None else out_end
+        in_end = len(in_buffer) if in_end is None else in_end
+        self._profile.record(self._chip, out_buffer[out_start],
+                             out_end - out_start + in_end - in_start,
+                             time.perf_counter() - started)
+
+
+def instrument(io, profile):
+    """Wrap every expander of an IoBackend. Safe to call again after
+    IoBackend.reopen(), chips already wrapped are left alone."""
+    for kind, chips in (("in", io.inputChips), ("led", io.ledChips)):
+        for index, chip in enumerate(chips):
+            if isinstance(chip._device, ProfiledI2CDevice):
+                continue
+            chip._device = ProfiledI2CDevice(chip._device, profile, f"{kind}{index}")
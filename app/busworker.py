@@ -0,0 +1,147 @@
+"""Single owner thread for the I2C bus"""
+import itertools
+import queue
+import threading
+import time
+
+from PyQt5 import QtCore as qtc
+
+
+class BusWorker(qtc.QThread):
+    """Runs every MCP23017 transaction on one thread.
+
+    Commands are queued with a priority -- bus recovery, then interrupt and
+    port reads, then LED writes, then configuration -- and results are handed back to
+    the main thread through resultReady, so Qt never waits on the bus.
+    With startPolling the thread also runs a poll function at a fixed
+    rate in between commands. Whatever was queued during a poll runs
+    before the next one, and a poll that runs past the next one's time
+    counts as an overrun and pushes it back a whole interval, so a slow
+    bus lowers the poll rate rather than shutting out the queue.
+    """
+    RECOVER = -1
+    INTERRUPT = 0
+    LED = 1
+    CONFIG = 2
+    _STOP = -2
+
+    # The following signals are connected in the main thread
+    resultReady = qtc.pyqtSignal(object, object)  # callback, result
+    commandFailed = qtc.pyqtSignal(str, str)  # command name, error
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._queue = queue.PriorityQueue()
+        # Tie breaker so equal priorities run in submission order
+        self._order = itertools.count()
+        self._timingLock = threading.Lock()
+        self._timing = {}
+        # Optional fixed rate task, see startPolling
+        self._pollFn = None
+        self._pollName = None
+        self._pollInterval = None
+        self._nextPoll = None
+        self.pollOverruns = 0
+        # Name of the command running now, None between commands
+        self.currentName = None
+        self.resultReady.connect(self._deliver)
+
+    def submit(self, priority, name, fn, *args, callback=None):
+        """Queue fn(*args) to run on the bus thread. Safe from any thread.
+
+        If callback is given it is called with the result in the main thread.
+        """
+        self._queue.put((priority, next(self._order), time.monotonic(),
+                         name, fn, args, callback))
+
+    def startPolling(self, intervalS, name, fn):
+        """Run fn() every intervalS seconds on the bus thread. Call before start()."""
+        self._pollName = name
+        self._pollInterval = intervalS
+        self._nextPoll = time.monotonic()
+        self._pollFn = fn
+
+    def queueDepth(self):
+        return self._queue.qsize()
+
+    def timing(self):
+        """Per command name: count, total/max run time and queue wait in ms"""
+        with self._timingLock:
+            return {name: dict(entry) for name, entry in self._timing.items()}
+
+    def stop(self):
+        self._queue.put((self._STOP, next(self._order), time.monotonic(),
+                         None, None, (), None))
+        self.wait()
+
+    def run(self):
+        while True:
+            timeout = None
+            if self._pollFn is not None:
+                now = time.monotonic()
+                if now >= self._nextPoll:
+                    self._poll(now)
+                    # Everything that queued up meanwhile, before polling again
+                    for _ in range(self._queue.qsize()):
+                        try:
+                            command = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if not self._runCommand(command):
+                            return
+                    continue
+                timeout = self._nextPoll - now
+            try:
+                command = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if not self._runCommand(command):
+                return
+
+    def _runCommand(self, command):
+        """False for the stop command"""
+        _, _, queuedAt, name, fn, args, callback = command
+        if fn is None:
+            return False
+        started = time.monotonic()
+        self.currentName = name
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self.commandFailed.emit(name, str(e))
+            return True
+        finally:
+            self.currentName = None
+            self._record(name, queuedAt, started, time.monotonic())
+        if callback is not None:
+            self.resultReady.emit(callback, result)
+        return True
+
+    def _poll(self, now):
+        self.currentName = self._pollName
+        try:
+            self._pollFn()
+        except Exception as e:
+            self.commandFailed.emit(self._pollName, str(e))
+        finally:
+            self.currentName = None
+            finished = time.monotonic()
+            self._record(self._pollName, now, now, finished)
+        self._nextPoll += self._pollInterval
+        if self._nextPoll <= finished:
+            # Ran into the next poll's slot - skip it rather than poll back to back
+            self.pollOverruns += 1
+            self._nextPoll = finished + self._pollInterval
+
+    def _record(self, name, queuedAt, started, finished):
+        runMs = (finished - started) * 1000
+        with self._timingLock:
+            entry = self._timing.setdefault(
+                name, {"count": 0, "totalMs": 0.0, "maxMs": 0.0, "waitMs": 0.0})
+            entry["count"] += 1
+            entry["totalMs"] += runMs
+            entry["maxMs"] = max(entry["maxMs"], runMs)
+            entry["waitMs"] += (started - queuedAt) * 1000
+
+    def _deliver(self, callback, result):
+        callback(result)
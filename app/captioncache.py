@@ -0,0 +1,123 @@
+"""Compiled captions kept on disk between runs.
+
+Every clip's cues go into one packed file, memory-mapped at start up so
+nothing is read until a clip's captions are shown. Each clip records
+its .srt's mtime and size; if any source has changed, gone or appeared,
+the file is compiled again from the .srt files.
+
+    header      magic, clip count, cue count, text bytes
+    clips       per clip: source mtime_ns, size, first cue, cue count,
+                name offset and length in the text
+    starts      int32 per cue, ms
+    ends        int32 per cue, ms
+    offsets     uint32 per cue + 1, where each cue's text starts
+    text        UTF-8, every clip name ('<type>/<name>'), then every
+                cue text
+
+In native byte order - the file never leaves the machine that made it.
+"""
+from array import array
+import mmap
+import os
+import struct
+
+# 02: names all ahead of the cue texts. 01 files ran each clip's last
+# cue into the next clip's name, and are compiled again
+MAGIC = b'SBCAPS02'
+HEADER = struct.Struct('=8sIII')
+CLIP = struct.Struct('=qqIIII')
+
+
+class PackedTexts:
+    """A clip's cue texts, decoded from the mapped file when asked for"""
+
+    def __init__(self, text, offsets, first, count):
+        self._text = text
+        self._offsets = offsets
+        self._first = first
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        start = self._offsets[self._first + index]
+        end = self._offsets[self._first + index + 1]
+        return bytes(self._text[start:end]).decode('utf-8')
+
+
+def write(cachePath, clips):
+    """`clips` is [(name, mtime_ns, size, index)], index has starts, ends
+    and texts"""
+    records = []
+    starts = array('i')
+    ends = array('i')
+    offsets = array('I')
+    text = bytearray()
+    # Every name ahead of the cue texts, so each cue's text runs up to the
+    # next cue's offset and no further
+    nameAt = []
+    for name, mtime, size, index in clips:
+        nameAt.append(len(text))
+        text += name.encode('utf-8')
+    nameAt.append(len(text))
+    for clip, (name, mtime, size, index) in enumerate(clips):
+        records.append((mtime, size, len(starts), len(index.starts),
+                        nameAt[clip], nameAt[clip + 1] - nameAt[clip]))
+        starts.extend(index.starts)
+        ends.extend(index.ends)
+        for caption in index.texts:
+            offsets.append(len(text))
+            text += caption.encode('utf-8')
+    offsets.append(len(text))
+
+    tmpPath = cachePath + '.tmp'
+    with open(tmpPath, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(records), len(starts), len(text)))
+        for record in records:
+            f.write(CLIP.pack(*record))
+        f.write(starts.tobytes())
+        f.write(ends.tobytes())
+        f.write(offsets.tobytes())
+        f.write(text)
+    os.replace(tmpPath, cachePath)
+
+
+def load(cachePath, sources):
+    """{name: (starts, ends, texts)} out of the mapped file, or None if
+    it's missing, damaged or `sources` ([(name, path, mtime_ns, size)])
+    don't match what it was compiled from"""
+    try:
+        with open(cachePath, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(buf) < HEADER.size:
+        return None
+    magic, clipCount, cueCount, textBytes = HEADER.unpack_from(buf)
+    startsAt = HEADER.size + clipCount * CLIP.size
+    endsAt = startsAt + 4 * cueCount
+    offsetsAt = endsAt + 4 * cueCount
+    textAt = offsetsAt + 4 * (cueCount + 1)
+    if magic != MAGIC or len(buf) != textAt + textBytes or clipCount != len(sources):
+        return None
+
+    view = memoryview(buf)
+    text = view[textAt:]
+    records = []
+    for clip, (name, path, mtime, size) in enumerate(sources):
+        record = CLIP.unpack_from(buf, HEADER.size + clip * CLIP.size)
+        nameOffset, nameLength = record[4:]
+        if (record[:2] != (mtime, size)
+                or bytes(text[nameOffset:nameOffset + nameLength]) != name.encode('utf-8')):
+            return None
+        records.append((name, record[2], record[3]))
+
+    starts = view[startsAt:endsAt].cast('i')
+    ends = view[endsAt:offsetsAt].cast('i')
+    offsets = view[offsetsAt:textAt].cast('I')
+    return {name: (starts[first:first + count], ends[first:first + count],
+                   PackedTexts(text, offsets, first, count))
+            for name, first, count in records}
@@ -0,0 +1,207 @@
+"""Captions kept in step with the voice channel.
+
+Cue times in an .srt are positions in the clip, so rather than timing
+each cue from the one before, the scheduler asks the channel where it is
+(`clock()`, timeMs() in ms, -1 before it starts) and sleeps on a single
+timer until the next cue starts or the one showing ends. On waking it
+asks again: if the audio stalled or started late the cue waits for it,
+and nothing adds up over a long clip. Between cues the caption is
+cleared. Finding the cue for a position is a binary search over the
+starts, so captions can pick up anywhere in a clip - a resumed call, or
+the audio jumping - at the same cost as the next cue.
+
+Every .srt under the captions directory is compiled at start up into a
+CaptionIndex - cue starts and ends as int arrays and a table of texts -
+so starting a clip's captions reads no files and parses nothing. With a
+cache file (see captioncache.py) the compiled indexes are mapped from
+it instead, and the .srt files are only read again when one changes.
+"""
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+import os
+import time
+
+from PyQt5 import QtCore as qtc
+
+import captioncache
+
+# How often to look again while the clock isn't running
+IDLE_POLL_MS = 20
+# Timer resolution is a few ms, don't wake for less
+MIN_WAIT_MS = 5
+
+Cue = namedtuple('Cue', 'start end text')
+
+
+def timeToMs(timeStr):
+    """'00:01:02,345' -> 62345"""
+    hours, minutes, secondsMs = timeStr.split(':')
+    seconds, milliseconds = secondsMs.split(',')
+    return int(hours) * 3600000 + int(minutes) * 60000 + int(seconds) * 1000 + int(milliseconds)
+
+
+def parseSrt(text):
+    """Cues in file order"""
+    cues = []
+    for block in text.split('\n\n'):
+        if '-->' not in block:
+            continue
+        try:
+            number, times, caption = block.strip('\n').split('\n', 2)
+            start, end = times.split(' --> ')
+            cues.append(Cue(timeToMs(start), timeToMs(end), caption))
+        except ValueError as e:
+            print(f"Error processing caption: {e}")
+    return cues
+
+
+class CaptionIndex:
+    """One clip's cues as parallel arrays, in start order"""
+
+    def __init__(self, starts, ends, texts):
+        self.starts = starts
+        self.ends = ends
+        self.texts = texts
+
+    @classmethod
+    def fromCues(cls, cues):
+        cues = sorted(cues, key=lambda cue: cue.start)
+        return cls(array('i', (cue.start for cue in cues)),
+                   array('i', (cue.end for cue in cues)),
+                   [cue.text for cue in cues])
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def sources(captionDir):
+    """[(name, path, mtime_ns, size)] of every <type>/<name>.srt"""
+    found = []
+    for fileType in sorted(os.listdir(captionDir)):
+        typeDir = os.path.join(captionDir, fileType)
+        if not os.path.isdir(typeDir):
+            continue
+        for fileName in sorted(os.listdir(typeDir)):
+            name, ext = os.path.splitext(fileName)
+            if ext != '.srt':
+                continue
+            path = os.path.join(typeDir, fileName)
+            stat = os.stat(path)
+            found.append((fileType + '/' + name, path, stat.st_mtime_ns, stat.st_size))
+    return found
+
+
+class CaptionLibrary:
+    """A CaptionIndex for every <type>/<name>.srt under `captionDir`,
+    mapped from `cachePath` when it's up to date"""
+
+    def __init__(self, captionDir, cachePath=None):
+        self.captionDir = captionDir
+        self.cachePath = cachePath
+        self.fromCache = False
+        started = time.monotonic()
+        # '<type>/<name>' -> CaptionIndex
+        self._clips = self._load()
+        self.buildMs = (time.monotonic() - started) * 1000
+
+    def _load(self):
+        found = sources(self.captionDir)
+        if self.cachePath:
+            mapped = captioncache.load(self.cachePath, found)
+            if mapped is not None:
+                self.fromCache = True
+                return {name: CaptionIndex(*arrays) for name, arrays in mapped.items()}
+        clips = {}
+        for name, path, mtime, size in found:
+            with open(path, 'r') as f:
+                clips[name] = CaptionIndex.fromCues(parseSrt(f.read()))
+        if self.cachePath:
+            try:
+                captioncache.write(self.cachePath, [(name, mtime, size, clips[name])
+                                                    for name, path, mtime, size in found])
+            except OSError as e:
+                print(f"Couldn't write caption cache {self.cachePath}: {e}")
+        return clips
+
+    def get(self, fileType, name):
+        """The clip's index, None if it has no captions"""
+        return self._clips.get(fileType + '/' + name)
+
+    def summary(self):
+        cues = sum(len(index) for index in self._clips.values())
+        how = f"mapped from {self.cachePath}" if self.fromCache else "compiled"
+        return (f"-- Captions {self.captionDir}: {len(self._clips)} clips, {cues} cues, "
+                f"{how} in {self.buildMs:.1f} ms --")
+
+
+class CaptionScheduler(qtc.QObject):
+    """Shows each cue through `show(text)` as `clock()` reaches its start,
+    and `show('')` as it reaches its end"""
+
+    def __init__(self, clock, show, parent=None):
+        super().__init__(parent)
+        self.clock = clock
+        self.show = show
+        self.cues = None
+        # Cues started so far, and whether the last of them is showing
+        self.index = 0
+        self.showing = False
+        self.timer = qtc.QTimer(self)
+        self.timer.setSingleShot(True)
+        # Coarse timers can be 5% late, a long gap would put a cue out by far more
+        self.timer.setTimerType(qtc.Qt.PreciseTimer)
+        self.timer.timeout.connect(self._tick)
+
+    def start(self, cues, atMs=None):
+        """`cues` is a CaptionIndex. Captions pick up `atMs` into the clip,
+        or wherever the clock is"""
+        self.stop()
+        self.cues = cues
+        self.seek(self.clock() if atMs is None else atMs)
+
+    def seek(self, ms):
+        """Show the cue `ms` into the clip, then follow the clock from there"""
+        if self.cues is None:
+            return
+        self.timer.stop()
+        self._moveTo(ms)
+        self._tick()
+
+    def stop(self):
+        self.timer.stop()
+        self.cues = None
+        self.index = 0
+        self.showing = False
+
+    def isActive(self):
+        return self.cues is not None and (self.index < len(self.cues) or self.showing)
+
+    def _moveTo(self, ms):
+        """Show or clear for position `ms`, if that's not what's up already"""
+        index = bisect_right(self.cues.starts, ms)
+        showing = index > 0 and ms < self.cues.ends[index - 1]
+        if (index, showing) == (self.index, self.showing):
+            return
+        self.index = index
+        self.showing = showing
+        self.show(self.cues.texts[index - 1] if showing else '')
+
+    def _tick(self):
+        if not self.isActive():
+            return
+        now = self.clock()
+        if now < 0:
+            # Not playing yet, or stalled stopped
+            self.timer.start(IDLE_POLL_MS)
+            return
+        # The clip may have gone back or skipped ahead since the last look
+        self._moveTo(now)
+        if not self.isActive():
+            return
+        # Whichever comes first, the next start or the end of this cue
+        due = self.cues.starts[self.index] if self.index < len(self.cues) else None
+        if self.showing:
+            end = self.cues.ends[self.index - 1]
+            due = end if due is None else min(due, end)
+        self.timer.start(max(MIN_WAIT_MS, int(due - now)))
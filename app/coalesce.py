@@ -0,0 +1,62 @@
+"""Merge bursts of pin edges into one port change"""
+import threading
+
+
+class EdgeCoalescer:
+    """Collects edges from the bus thread for a short window.
+
+    The first edge opens a window of `windowMs`; every edge until it closes
+    is folded in, then onBurst(fromWord, toWord, edgeCounts) is called once
+    from the window's timer thread. edgeCounts[pin] is how many times that
+    pin changed, so a pin can show edges even when fromWord and toWord agree
+    (a wiggle that ended where it began).
+    """
+
+    def __init__(self, onBurst, windowMs=15, pinCount=16):
+        self._onBurst = onBurst
+        self.windowMs = windowMs
+        self.pinCount = pinCount
+        self._lock = threading.Lock()
+        self._timer = None
+        self._fromWord = None
+        self._toWord = None
+        self._counts = None
+        # Totals, to see how much the window saves
+        self.edges = 0
+        self.bursts = 0
+
+    def add(self, fromWord, changes, toWord):
+        """changes is [(pin, level)] as serviceInterrupt and PortPoller give"""
+        if not changes:
+            return
+        with self._lock:
+            if self._timer is None:
+                self._fromWord = fromWord
+                self._counts = [0] * self.pinCount
+                self._timer = threading.Timer(self.windowMs / 1000, self._close)
+                self._timer.daemon = True
+                self._timer.start()
+            for pin, _ in changes:
+                self._counts[pin] += 1
+            self._toWord = toWord
+            self.edges += len(changes)
+
+    def cancel(self):
+        """Drop any open window, e.g. when the port is reconfigured"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def summary(self):
+        return (f"-- Coalescing ({self.windowMs} ms): {self.edges} edges in "
+                f"{self.bursts} events --")
+
+    def _close(self):
+        with self._lock:
+            if self._timer is not threading.current_thread():
+                return  # cancelled
+            self._timer = None
+            self.bursts += 1
+            burst = (self._fromWord, self._toWord, self._counts)
+        self._onBurst(*burst)
@@ -1,4 +1,6 @@
 import sys
+import signal
+import time
 # import json
 from PyQt5 import QtWidgets as qtw
 from PyQt5 import QtCore as qtc
@@ -7,29 +9,56 @@ from PyQt5.QtWidgets import QDesktopWidget
 from PyQt5.QtCore import QMutex, QMutexLocker
 
 # import vlc
-import board
-import busio
-from digitalio import Direction, Pull
-from RPi import GPIO
-from adafruit_mcp230xx.mcp23017 import MCP23017
-
+import expander
+import hardware
+import settings
+import busprofile
+from busworker import BusWorker
+from captions import CaptionLibrary, CaptionScheduler
+from coalesce import EdgeCoalescer
+from debounce import PinDebouncer
+import history
+from history import EdgeHistory
+from latency import plugLatency
+from polling import InputStats, PortPoller
+from recovery import BusRecovery
 from model import Model
+from leds import LedDriver
+from ports import PortSnapshot
+import wiring
+from wiring import PINS_PER_CHIP, chipWord, setChipWord
 
 class MainWindow(qtw.QMainWindow): 
     # Most of this module is analogous to svelte Panel
 
     # These signals are internal to control.py
     startPressed = qtc.pyqtSignal()
-    plugEventDetected = qtc.pyqtSignal()
     plugInToHandle = qtc.pyqtSignal(int)
     unPlugToHandle = qtc.pyqtSignal(int)
     dualUnplugToHandle = qtc.pyqtSignal(int, int)  # pin1, pin2
 
-    # NEW: Thread-safe signal for GPIO interrupts
-    gpioInterruptSignal = qtc.pyqtSignal(list)  # Will carry the list of interrupt flags
+    # Thread-safe signal for GPIO changes, one per coalesced burst
+    portChangedSignal = qtc.pyqtSignal(object, object, list)  # from word, to word, edge counts per pin
     
     awaitingRestart = False
-    interrupt = 17
+    # Upper bound on re-reads while the INT line stays low
+    MAX_INTERRUPT_PASSES = 4
+    # How long one GPIO read answers pin questions before re-reading
+    PORT_SNAPSHOT_MAX_AGE_MS = 20
+    # Per-jack debounce: quiet time after an edge, then this many
+    # matching port samples this far apart
+    DEBOUNCE_SETTLE_MS = 20
+    DEBOUNCE_SAMPLES = 3
+    DEBOUNCE_SAMPLE_MS = 8
+    # Edges this close together reach the main thread as one port change
+    COALESCE_WINDOW_MS = 15
+    # Plug-in and unplug records kept for misuse and dual-unplug checks,
+    # well over MISUSE_THRESHOLD; older ones are overwritten
+    HISTORY_CAPACITY = 32
+    # Unplugs this close together count as a dual unplug
+    DUAL_UNPLUG_WINDOW_MS = 500
+    # Keyboard stand-ins for the first 12 people's jacks with the simulated backend
+    SIM_JACK_KEYS = '0123456789ab'
 
     def __init__(self):
         # self.pygame.init()
@@ -77,41 +106,30 @@ class MainWindow(qtw.QMainWindow):
         self.model = Model()
 
         # --- timers --- 
-        self.bounceTimer=qtc.QTimer()
-        self.bounceTimer.timeout.connect(self.continueCheckPin)
-        self.bounceTimer.setSingleShot(True)
         self.blinkTimer=qtc.QTimer()
         self.blinkTimer.timeout.connect(self.blinker)
 
-        self.captionTimer=qtc.QTimer()
-        self.captionTimer.setSingleShot(True)
-        self.captionTimer.timeout.connect(self.display_next_caption)
-        self.captionIndex = 0
-        self.captions = 'empty'
-        self.areCaptionsContinuing = True
+        # Every clip's captions, compiled once
+        self.captionLibrary = CaptionLibrary(settings.CAPTION_DIR, settings.CAPTION_CACHE)
+        print(self.captionLibrary.summary())
+        # Captions follow whichever channel is the voice when it's asked
+        self.captions = CaptionScheduler(lambda: self.model.voice.timeMs(),
+            self.displayText, self)
 
         # === MISUSE DETECTION ===
         # Track plug-ins to detect rapid/chaotic usage
-        self.plugin_history = []  # List of (time, pin) tuples
+        self.plugin_history = EdgeHistory(self.HISTORY_CAPACITY)
         self.MISUSE_THRESHOLD = 4  # Number of plug-ins
         self.MISUSE_WINDOW = 12000  # 12 seconds in milliseconds
-        
-        # Timer to periodically clean old plug-in history
-        self.cleanupTimer = qtc.QTimer()
-        self.cleanupTimer.timeout.connect(self.cleanupPluginHistory)
-        self.cleanupTimer.start(5000)  # Clean every 5 seconds
 
         # Self (control) for gpio related, self.model for audio
         self.startPressed.connect(self.startSim)
 
-        # Bounce timer less than 200 cause failure to detect 2nd line
-        # Tested with 100
-        self.plugEventDetected.connect(lambda: self.bounceTimer.start(300))
         self.plugInToHandle.connect(self.model.handlePlugIn)
         self.unPlugToHandle.connect(self.model.handleUnPlug)
         
-        # NEW: Connect the thread-safe GPIO signal
-        self.gpioInterruptSignal.connect(self.handleGpioInterrupt)
+        # Connect the thread-safe GPIO signal
+        self.portChangedSignal.connect(self.handlePortChange)
 
         # Events from model.py
         self.model.displayTextSignal.connect(self.displayText)
@@ -130,69 +148,95 @@ class MainWindow(qtw.QMainWindow):
         self.interrupt_lock = qtc.QMutex()  # Thread safety for pending_interrupts
 
         # Enhanced tracking for dual-unplug detection
-        self.unplug_history = []  # Track all unplugs with timestamps
+        self.unplug_history = EdgeHistory(self.HISTORY_CAPACITY)
         self.last_unplug_time = None
         self.last_unplug_pin = -1
 
-        # Initialize the I2C bus:
-        i2c = busio.I2C(board.SCL, board.SDA)
-        self.mcp = MCP23017(i2c) # default address-0x20
-        # self.mcpRing = MCP23017(i2c, address=0x22)
-        self.mcpLed = MCP23017(i2c, address=0x21)
+        # Which expander pin is which person's jack and LED, and where the
+        # buttons are. Model and control talk in person indexes; port and
+        # LED words are in expander bits.
+        self.wiring = wiring.load(settings.WIRING_FILE)
+
+        # Jack/button expanders, LED expanders and the interrupt lines, either
+        # the real bonnets or the simulator (settings.IO_BACKEND)
+        self.io = hardware.createBackend(settings.IO_BACKEND, self.wiring)
+        # Every I2C transaction is counted against the bus command making it
+        self.busProfile = busprofile.BusProfile(lambda: self.bus.currentName)
+        busprofile.instrument(self.io, self.busProfile)
+
+        # From here on all expander traffic goes through one bus thread,
+        # so the main thread never waits on I2C
+        self.bus = BusWorker()
+        self.bus.commandFailed.connect(self.handleBusError)
+
+        # Jacks are read either on the INT line or by sampling the port on
+        # the bus thread (settings.INPUT_MODE). Both feed the coalescer,
+        # which sends one portChangedSignal per burst of edges.
+        self.coalescer = EdgeCoalescer(self.portChangedSignal.emit,
+            self.COALESCE_WINDOW_MS, self.wiring.inputWidth)
+        self.poller = None
+        if settings.INPUT_MODE == 'poll':
+            self.poller = PortPoller(self.io.readPort, self.portPolled,
+                settings.POLL_HZ, self.io.lastInputChange, self.wiring.inputWidth)
+            self.bus.startPolling(1 / settings.POLL_HZ, 'poll', self.poller.poll)
+            self.inputStats = self.poller.stats
+        else:
+            self.inputStats = InputStats('interrupt')
+        self.bus.start()
 
-        # -- Make a list of pins for each bonnet, set input/output --
-        # Plug tip, which will trigger interrupts
-        self.pins = []
-        for pinIndex in range(0, 16):
-            self.pins.append(self.mcp.get_pin(pinIndex))
-        # Will be initiallized to pull.up in reset()
+        # Plug tip, which will trigger interrupts. Pin levels are read
+        # a whole port at a time on the bus thread, see PortSnapshot.
+        self.portSnapshot = PortSnapshot(maxAgeMs=self.PORT_SNAPSHOT_MAX_AGE_MS,
+            allHigh=self.wiring.allHigh)
+        # Last jack port word seen on the bus thread, all out until reset()
+        self.lastPortWord = self.wiring.allHigh
 
         # LEDs 
         # Tried to put these in the Model/logic module -- but seems all gpio
         # needs to be in this base/main module
-        self.pinsLed = []
-        for pinIndex in range(0, 12):
-            self.pinsLed.append(self.mcpLed.get_pin(pinIndex))
-        # Set to output in reset()
-
-        # -- Set up Tip interrupt --
-        self.mcp.interrupt_enable = 0xFFFF  # Enable Interrupts in all pins
-        # self.mcp.interrupt_enable = 0xFFF  # Enable Interrupts first 12 pins
-        # self.mcp.interrupt_enable = 0b0000111111111111  # Enable Interrupts in pins 0-11 aka 0xfff
-
-        # If intcon is set to 0's we will get interrupts on both
-        #  button presses and button releases
-        self.mcp.interrupt_configuration = 0x0000  # interrupt on any change
-        self.mcp.io_control = 0x44  # Interrupt as open drain and mirrored
-        # put this in startup?
-
-        self.mcp.clear_ints()  # Interrupts need to be cleared initially
+        # Changes are buffered and written to OLAT in one go per event loop
+        # pass, only to chips that changed. Set to output in configureExpanders()
+        self.leds = LedDriver(self.writeLeds, len(self.wiring.ledAddresses))
+
+        # Each jack settles on its own, confirmed from port samples read
+        # on the bus thread. Replaces the single shared 300 ms bounce timer,
+        # which let two jacks changing together overwrite each other.
+        self.debouncer = PinDebouncer(self.samplePort, self.wiring.inputWidth,
+            settleMs=self.DEBOUNCE_SETTLE_MS,
+            samplesNeeded=self.DEBOUNCE_SAMPLES,
+            sampleMs=self.DEBOUNCE_SAMPLE_MS)
+        self.debouncer.pinConfirmed.connect(self.jackConfirmed)
+
+        # Pins, LEDs and the tip interrupt are set up by reset()
         self.reset()
 
-        # Instead of defining checkPin inside __init__, use:
-        self.interrupt = 17  # Define as an instance variable for reuse in reset()
-        GPIO.setmode(GPIO.BCM)
+        if self.poller is None:
+            self.io.attachInterrupt(self.checkPin)
 
-        # First remove any existing event detection
-        try:
-            GPIO.remove_event_detect(self.interrupt)
-        except:
-            pass  # Handle exception if no event detection exists
+        # Repeated bus errors or a stuck INT line get the expanders
+        # re-initialised in place, instead of restarting the whole exhibit
+        if self.poller is None:
+            self.recovery = BusRecovery(self.bus, self.recoverBus, self.busRecovered,
+                self.io.interruptAsserted, self.serviceStuckInterrupt)
+        else:
+            self.recovery = BusRecovery(self.bus, self.recoverBus, self.busRecovered)
+        self.recovery.start()
 
-        GPIO.setup(self.interrupt, GPIO.IN, GPIO.PUD_UP)
-        GPIO.add_event_detect(self.interrupt, GPIO.BOTH, callback=self.checkPin, bouncetime=50)
+        # kill -USR1 <pid> prints latency and bus stats. Python only runs
+        # signal handlers between bytecodes, so keep the interpreter ticking.
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.dumpStats())
+        self.signalTimer = qtc.QTimer()
+        self.signalTimer.timeout.connect(lambda: None)
+        self.signalTimer.start(500)
 
     def checkForMisuse(self):
         """Check if user is plugging in too rapidly"""
-        current_time = qtc.QTime.currentTime()
-        
-        # Remove old entries outside the window
-        cutoff_time = current_time.addMSecs(-self.MISUSE_WINDOW)
-        self.plugin_history = [(t, p) for t, p in self.plugin_history if t > cutoff_time]
-        
+        # Plug-ins inside the window
+        recent = self.plugin_history.countSince(history.nowMs() - self.MISUSE_WINDOW)
+
         # Check if we've exceeded the threshold
-        if len(self.plugin_history) >= self.MISUSE_THRESHOLD:
-            print(f" *** MISUSE DETECTED: {len(self.plugin_history)} plug-ins within {self.MISUSE_WINDOW/1000} seconds")
+        if recent >= self.MISUSE_THRESHOLD:
+            print(f" *** MISUSE DETECTED: {recent} plug-ins within {self.MISUSE_WINDOW/1000} seconds")
             # Stop everything
             self.handleMisuse()
             return True
@@ -213,69 +257,168 @@ class MainWindow(qtw.QMainWindow):
         # Log the misuse
         print(" *** Simulation stopped due to rapid plug-ins (misuse detected)")
     
-    def cleanupPluginHistory(self):
-        """Periodically clean old entries from plugin history"""
-        if self.plugin_history:
-            current_time = qtc.QTime.currentTime()
-            cutoff_time = current_time.addMSecs(-self.MISUSE_WINDOW)
-            old_count = len(self.plugin_history)
-            self.plugin_history = [(t, p) for t, p in self.plugin_history if t > cutoff_time]
-            if old_count != len(self.plugin_history):
-                print(f" - Cleaned {old_count - len(self.plugin_history)} old plug-in entries")
-
-
     def checkPin(self, port):
         """GPIO interrupt callback - runs in interrupt thread.
-        We must be thread-safe here, so we just gather data and emit a signal.
+        Only queues the read, the bus thread does the rest in serviceInterrupt.
         """
-        try:
-            # Read interrupt flags and pin values in the interrupt thread
-            interrupt_data = []
-            for pin_flag in self.mcp.int_flag:
-                # Read the pin value while we're in the interrupt thread
-                pin_value = self.pins[pin_flag].value
-                interrupt_data.append((pin_flag, pin_value))
-            
-            # Emit signal to main thread with the data
-            if interrupt_data:
-                self.gpioInterruptSignal.emit(interrupt_data)
-        except Exception as e:
-            print(f"Error in GPIO interrupt handler: {e}")
-
-    def handleGpioInterrupt(self, interrupt_data):
-        """Handle GPIO interrupts in the main thread where Qt operations are safe"""
-        current_time = qtc.QTime.currentTime()
+        # A new plug event starts on the falling edge - the rising edge
+        # is just the line releasing after our read
+        if self.io.interruptAsserted(port):
+            plugLatency.begin()
+        self.bus.submit(BusWorker.INTERRUPT, 'checkPin', self.serviceInterrupt,
+            port, time.monotonic())
+
+    def serviceInterrupt(self, port, calledAt):
+        """Runs on the bus thread.
+        Only the chips on the INT line that fired are read. For each,
+        INTF, INTCAP and GPIO come back in one burst read, and every changed
+        pin goes to the coalescer.
+        """
+        cpuStart = time.thread_time()
+        interrupt_data = []
+        fromWord = self.lastPortWord
+        chips = self.io.chipsOnLine(port)
+        # Edges that land inside the RPi.GPIO bouncetime don't call us
+        # again, so keep servicing while the INT line is still asserted.
+        for _ in range(self.MAX_INTERRUPT_PASSES):
+            for chip in chips:
+                intf, intcap, gpio = self.io.readInterrupt(chip)
+                offset = chip * PINS_PER_CHIP
+                interrupt_data.extend(
+                    (offset + pin, value) for pin, value in expander.changedPins(
+                        intf, gpio, chipWord(self.lastPortWord, chip)))
+                self.lastPortWord = setChipWord(self.lastPortWord, chip, gpio)
+            self.portSnapshot.update(self.lastPortWord)
+            if not self.io.interruptAsserted(port):
+                break
+
+        latencyMs = None
+        if interrupt_data:
+            self.coalescer.add(fromWord, interrupt_data, self.lastPortWord)
+            changedAt = self.io.lastInputChange() or calledAt
+            latencyMs = (time.monotonic() - changedAt) * 1000
+        self.inputStats.add(time.thread_time() - cpuStart, latencyMs)
+
+    def portPolled(self, interrupt_data, word):
+        """PortPoller saw a change. Runs on the bus thread."""
+        plugLatency.begin()
+        fromWord = self.lastPortWord
+        self.lastPortWord = word
+        self.portSnapshot.update(word)
+        self.coalescer.add(fromWord, interrupt_data, word)
+
+    def handleBusError(self, name, error):
+        print(f"Error in bus command {name}: {error}")
+        self.recovery.busError(name, error)
+
+    def recoverBus(self):
+        """Runs on the bus thread, see BusRecovery.
+        Free the bus, fresh chip objects, full set up, and a port read."""
+        self.io.close()
+        self.io.clockBusFree()
+        self.io.reopen()
+        busprofile.instrument(self.io, self.busProfile)
+        word = self.configureExpanders()
+        if self.poller is None:
+            self.io.attachInterrupt(self.checkPin)
+        return word
+
+    def busRecovered(self, word):
+        # Chips were reset, so the LEDs need writing out again
+        self.syncPinsIn(word)
+        self.leds.invalidate()
+
+    def serviceStuckInterrupt(self):
+        """Watchdog saw INT held low - treat it as a missed edge"""
+        for channel in self.wiring.chipsOnLine():
+            if self.io.interruptAsserted(channel):
+                self.checkPin(channel)
+
+    def readPort(self):
+        """Runs on the bus thread"""
+        return self.io.readPort()
+
+    def writeLeds(self, word, chips, name):
+        self.bus.submit(BusWorker.LED, name, self.flushLeds, word, chips)
+
+    def flushLeds(self, word, chips):
+        """Runs on the bus thread"""
+        self.io.writeLeds(word, chips)
+        plugLatency.mark('led_write')
+
+    def dumpStats(self):
+        print(plugLatency.dump())
+        print(self.inputStats.summary())
+        print(self.coalescer.summary())
+        print(f"-- Bus queue depth: {self.bus.queueDepth()}, "
+              f"poll overruns: {self.bus.pollOverruns} --")
+        for name, entry in sorted(self.bus.timing().items()):
+            print(f"{name:<24} n={entry['count']:<6} "
+                  f"mean={entry['totalMs'] / entry['count']:7.2f} "
+                  f"max={entry['maxMs']:7.2f} "
+                  f"wait={entry['waitMs'] / entry['count']:7.2f} ms")
+        print(self.busProfile.summary())
+        print(self.recovery.summary())
+        print(self.model.audio.summary())
+        print(self.model.chainGap.summary())
+        print(self.model.dispatcher.summary())
+        print(self.captionLibrary.summary())
+
+    def samplePort(self):
+        """Fresh port read for the debouncer"""
+        def portRead(word):
+            self.portSnapshot.update(word)
+            self.debouncer.sample(word)
+        self.bus.submit(BusWorker.INTERRUPT, 'continueCheckPin', self.readPort,
+            callback=portRead)
+
+    def withFreshPort(self, name, callback):
+        """Call callback once portSnapshot is current, reading the port
+        on the bus thread first if it's stale"""
+        if self.portSnapshot.isFresh():
+            callback()
+            return
+
+        def portRead(word):
+            self.portSnapshot.update(word)
+            callback()
+        self.bus.submit(BusWorker.INTERRUPT, name, self.readPort, callback=portRead)
+
+    def handlePortChange(self, fromWord, toWord, edgeCounts):
+        """Handle a burst of GPIO changes in the main thread where Qt operations are safe.
+        Pins that bounced only show up once, at the level they ended on."""
+        plugLatency.mark('main_thread')
+        current_time = history.nowMs()
         unplugs_detected = []
-        
-        # First, collect all unplugs from this interrupt batch
+        changed = [(pin, bool(toWord >> pin & 1))
+                   for pin, count in enumerate(edgeCounts) if count]
+        # Jacks by person index, anything else is a button (or unwired)
+        personAt = self.wiring.personAt
+        interrupt_data = [(personAt[pin], value) for pin, value in changed if pin in personAt]
+        buttons = [(pin, value) for pin, value in changed if pin not in personAt]
+        edges = {pin: count for pin, count in enumerate(edgeCounts) if count}
+        width = self.wiring.inputWidth
+        print(f"* Port change {fromWord:0{width}b} -> {toWord:0{width}b}, edges: {edges}")
+
+        # First, collect all unplugs from this burst
         for pin_flag, pin_value in interrupt_data:
-            print(f"* Interrupt - pin number: {pin_flag} changed to: {pin_value}")
-            
             # Check if this is an unplug (pin went high and was previously in)
-            if (pin_flag < 12 and 
-                pin_value == True and 
+            if (pin_value == True and 
                 self.model.getIsPinIn(pin_flag)):
                 unplugs_detected.append(pin_flag)
         
         # Add unplugs to history
         for pin in unplugs_detected:
-            self.unplug_history.append({
-                'pin': pin,
-                'time': current_time,
-                'processed': False
-            })
-            # Keep only last 5 seconds of history
-            five_seconds_ago = current_time.addSecs(-5)
-            self.unplug_history = [u for u in self.unplug_history if u['time'] > five_seconds_ago]
+            self.unplug_history.append(pin, history.UNPLUG, current_time)
         
         # Print current pin states for debugging
         if unplugs_detected:
             print(f" DEBUG: Unplugs detected: {unplugs_detected}")
-            print(f" DEBUG: Current pin states (0-11): ", end="")
-            for i in range(12):
+            print(f" DEBUG: Current pin states: ", end="")
+            for i in self.wiring.persons:
                 print(f"{i}:{'IN' if self.model.getIsPinIn(i) else 'OUT'} ", end="")
             print()
-            print(f" DEBUG: Unplug history: {[(u['pin'], u['time'].toString('hh:mm:ss.zzz')) for u in self.unplug_history[-5:]]}")
+            print(f" DEBUG: Unplug history: {[(pin, f'{current_time - t:.0f} ms ago') for t, pin, _, _ in self.unplug_history.last(5)]}")
         
         # Check for dual-unplug scenario
         dual_unplug = False
@@ -289,10 +432,12 @@ class MainWindow(qtw.QMainWindow):
         elif len(unplugs_detected) == 1:
             current_pin = unplugs_detected[0]
             # Look for another unplug in recent history
-            for hist in reversed(self.unplug_history[:-1]):  # Skip the current one
-                time_diff = hist['time'].msecsTo(current_time)
-                if time_diff < 500 and hist['pin'] != current_pin:  # Within 500ms
-                    print(f" ** DUAL-UNPLUG DETECTED (from history): pins {hist['pin']} and {current_pin} unplugged within {time_diff}ms")
+            newest = len(self.unplug_history) - 1  # the current one
+            for index, (t, pin, _, _) in self.unplug_history.recent(
+                    self.DUAL_UNPLUG_WINDOW_MS, current_time):
+                if index != newest and pin != current_pin:
+                    time_diff = current_time - t
+                    print(f" ** DUAL-UNPLUG DETECTED (from history): pins {pin} and {current_pin} unplugged within {time_diff:.0f}ms")
                     dual_unplug = True
                     break
         
@@ -303,31 +448,47 @@ class MainWindow(qtw.QMainWindow):
         
         # Process interrupts normally
         for pin_flag, pin_value in interrupt_data:
-            # Test for phone jack vs start and stop buttons
-            if pin_flag < 12:
-                # Track if this interrupt is being processed or ignored
-                if (pin_value == True and self.model.getIsPinIn(pin_flag)):
-                    if self.just_checked:
-                        print(f" * Interrupt for pin {pin_flag} (unplug) ignored due to just_checked")
-                
-                # Don't restart this interrupt checking if we're still
-                # in the pause part of bounce checking
-                if not self.just_checked:
-                    self.pinFlag = pin_flag
-                    self.plugEventDetected.emit()
-                    # Mark this unplug as being processed
-                    for u in self.unplug_history:
-                        if u['pin'] == pin_flag and not u['processed']:
-                            u['processed'] = True
-                            break
-
-            else:
-                print(" * got to interrupt 12 or greater \n")
-                if pin_flag == 13 and pin_value == False:
-                    self.startPressed.emit() # Calls stopMedia
-                elif pin_flag == 12:
-                    print(f'   * got to stop, aka pin 12, {pin_value}')
-                    self.stopSim()
+            # Each pin settles on its own, continueCheckPin is
+            # called once it's confirmed
+            self.debouncer.edge(self.wiring.jackBit[pin_flag], pin_value)
+            # Mark this unplug as being processed
+            self.unplug_history.markProcessed(pin_flag)
+
+        # Start and stop buttons
+        for pin_flag, pin_value in buttons:
+            print(f" * got to button pin {pin_flag} \n")
+            # A press is a falling edge - either it started high, or
+            # it went down and back up again inside the burst
+            wasHigh = bool(fromWord >> pin_flag & 1)
+            pressed = wasHigh or edgeCounts[pin_flag] >= 2
+            if pin_flag == self.wiring.startBit and pressed:
+                self.startPressed.emit() # Calls stopMedia
+            elif pin_flag == self.wiring.stopBit:
+                print(f'   * got to stop, pin {pin_flag}, {pin_value}')
+                self.stopSim()
+
+    def shutdown(self):
+        self.recovery.stop()
+        self.io.close()
+        self.bus.stop()
+
+    def keyPressEvent(self, event):
+        """d prints stats. With the simulated backend the keyboard also stands
+        in for the board: 0-9, a, b toggle people 0-11's jacks, s presses Start,
+        x presses Stop"""
+        key = event.text().lower()
+        if key == 'd':
+            self.dumpStats()
+        elif settings.IO_BACKEND != 'sim':
+            return super().keyPressEvent(event)
+        elif key in self.SIM_JACK_KEYS:
+            person = self.SIM_JACK_KEYS.index(key)
+            if person in self.wiring.jackBit:
+                self.io.toggle(self.wiring.jackBit[person])
+        elif key == 's':
+            self.io.press(self.wiring.startBit)
+        elif key == 'x':
+            self.io.press(self.wiring.stopBit)
 
     def stopSim(self):
         print('stopping sim')
@@ -336,6 +497,10 @@ class MainWindow(qtw.QMainWindow):
 
     def startSim(self):
         self.stopMedia()
+        # Pins are checked once the bus thread has read the port
+        self.withFreshPort('getAnyPinsIn', self.continueStartSim)
+
+    def continueStartSim(self):
         if (self.getAnyPinsIn()):
             self.label.setText("Remove phone plugs and when you're ready, press Start")
         else:
@@ -350,39 +515,22 @@ class MainWindow(qtw.QMainWindow):
         self.model.stopAllAudio()
         self.model.stopTimers()
         # Stop blinking
-        if self.bounceTimer.isActive():
-            self.bounceTimer.stop()
         if self.blinkTimer.isActive():
             self.blinkTimer.stop()            
-        if self.captionTimer.isActive():
-            self.captionTimer.stop()  
-        if self.cleanupTimer.isActive():
-            self.cleanupTimer.stop()
 
     def reset(self):
-        # Clear interrupts
-        self.mcp.clear_ints()
-        
         self.label.setText("Press the Start button to begin!")
-        self.just_checked = False
-        self.pinFlag = 15
         self.pinToBlink = 0
         self.awaitingRestart = False
-        self.captionIndex = 0
 
-        # Synchronize pin states with model
-        for pinIndex in range(0, 12):
-            is_pin_in = self.pins[pinIndex].value == False
-            self.model.setPinIn(pinIndex, is_pin_in)
+        # Expander set up runs on the bus thread, then syncPinsIn gets
+        # the port word in this thread
+        self.bus.submit(BusWorker.CONFIG, 'reset', self.configureExpanders,
+            callback=self.syncPinsIn)
 
-        # Set to input - later will get interrupt as well
-        for pinIndex in range(0, 16):
-            self.pins[pinIndex].direction = Direction.INPUT
-            self.pins[pinIndex].pull = Pull.UP
-        
-        # Set LEDs to output and off
-        for pinIndex in range(0, 12):
-            self.pinsLed[pinIndex].switch_to_output(value=False)
+        # Set LEDs off
+        self.leds.allOff()
+        self.leds.invalidate()
 
         # Call model's reset
         self.model.reset()
@@ -390,79 +538,89 @@ class MainWindow(qtw.QMainWindow):
         self.model.detachAllEventHandlers()
 
         # Stop any active timers
-        if self.bounceTimer.isActive():
-            self.bounceTimer.stop()
         if self.blinkTimer.isActive():
             self.blinkTimer.stop()            
-        if self.captionTimer.isActive():
-            self.captionTimer.stop()  
+        self.captions.stop()
 
         # Clear misuse detection state
         self.plugin_history.clear()
-
-        # Reconfigure the MCP23017 interrupt system
-        self.mcp.interrupt_configuration = 0x0000  # interrupt on any change
-        self.mcp.io_control = 0x44  # Interrupt as open drain and mirrored
-        self.mcp.clear_ints()  # Final clear of interrupts
     
         # self.setLED(0, True)          
         # self.setLED(6, True)          
         # self.setLED(2, True)          
 
+    def configureExpanders(self):
+        """Runs on the bus thread. Returns the jack port word."""
+        word = self.io.configure()
+        # Baseline for spotting changed pins in serviceInterrupt
+        self.coalescer.cancel()
+        self.lastPortWord = word
+        if self.poller is not None:
+            self.poller.rebase(word)
+        return word
+
+    def syncPinsIn(self, word):
+        """Synchronize pin states with model from one port read"""
+        self.portSnapshot.update(word)
+        self.debouncer.resetLevels(word)
+        for person, pin in self.wiring.jackBit.items():
+            self.model.setPinIn(person, self.portSnapshot.isPinIn(pin))
+
     # Modified continueCheckPin to emit signal during active calls:
-    def continueCheckPin(self):
-        """Modified to detect ghost unplugs and handle dual-unplugs during active calls"""
-        # Not able to send param through timer, so pinFlag has been set globally
-        print(f" * In continue, pinFlag = {str(self.pinFlag)} " 
-            f"  * value: {str(self.pins[self.pinFlag].value)}")
+    def jackConfirmed(self, pin, pinValue):
+        """Debouncer works in port bits, the rest of the logic in people"""
+        self.continueCheckPin(self.wiring.personAt[pin], pinValue)
+
+    def continueCheckPin(self, pinFlag, pinValue):
+        """Called by the debouncer once pinFlag has settled at pinValue.
+        Modified to detect ghost unplugs and handle dual-unplugs during active calls"""
+        plugLatency.mark('debounced')
+        # The debouncer's last port sample answers every pin question below
+        print(f" * In continue, pinFlag = {str(pinFlag)} " 
+            f"  * value: {str(pinValue)}")
         
         # === GHOST UNPLUG DETECTION ===
         # When we process an unplug, check if any other "IN" pins are actually unplugged
-        if (self.pins[self.pinFlag].value == True and self.model.getIsPinIn(self.pinFlag)):
-            # This is an unplug - check for ghost unplugs
-            ghost_unplugs = []
-            for i in range(12):
-                if i != self.pinFlag and self.model.getIsPinIn(i):
-                    # Model thinks this pin is IN, but let's check actual state
-                    actual_value = self.pins[i].value
-                    if actual_value == True:  # Pin is actually unplugged!
-                        ghost_unplugs.append(i)
-                        print(f" ** GHOST UNPLUG DETECTED: pin {i} is physically unplugged but didn't generate interrupt!")
+        if (pinValue == True and self.model.getIsPinIn(pinFlag)):
+            # This is an unplug - check for ghost unplugs:
+            # pins the model thinks are IN but the port says are out
+            pinsIn = self.model.pinsIn
+            _, unplugged = self.portSnapshot.diff(pinsIn, self.wiring.jackBits(pinsIn))
+            ghost_unplugs = [i for i in unplugged if i != pinFlag]
+            for i in ghost_unplugs:
+                print(f" ** GHOST UNPLUG DETECTED: pin {i} is physically unplugged but didn't generate interrupt!")
             
             if ghost_unplugs:
-                print(f" ** DUAL-UNPLUG DETECTED (with ghost): pin {self.pinFlag} interrupted, pin(s) {ghost_unplugs} silently unplugged")
+                print(f" ** DUAL-UNPLUG DETECTED (with ghost): pin {pinFlag} interrupted, pin(s) {ghost_unplugs} silently unplugged")
                 
                 # Check if this is during an active call
                 if self.model.phoneLine["isEngaged"]:
                     print(f" ** DUAL-UNPLUG during ACTIVE CALL - handling both pins together")
                     # Emit dual-unplug signal instead of single unplug
-                    self.dualUnplugToHandle.emit(self.pinFlag, ghost_unplugs[0])
+                    self.dualUnplugToHandle.emit(pinFlag, ghost_unplugs[0])
                     # Skip the normal single unplug processing
-                    qtc.QTimer.singleShot(150, self.delayedFinishCheck)
                     return
         
         # Check if there's another recent unplug we should know about
-        current_time = qtc.QTime.currentTime()
-        for hist in reversed(self.unplug_history):
-            if hist['pin'] != self.pinFlag and not hist['processed']:
-                time_diff = hist['time'].msecsTo(current_time)
-                if time_diff < 500:
-                    print(f" ** POSSIBLE DUAL-UNPLUG: pin {hist['pin']} was unplugged {time_diff}ms ago")
+        current_time = history.nowMs()
+        for _, (t, pin, _, processed) in self.unplug_history.recent(
+                self.DUAL_UNPLUG_WINDOW_MS, current_time):
+            if pin != pinFlag and not processed:
+                print(f" ** POSSIBLE DUAL-UNPLUG: pin {pin} was unplugged {current_time - t:.0f}ms ago")
         
         if (self.awaitingRestart):
             # do nothing - awaiting press of start button
             print(' * awaiting restart')
         else:
             # Plug-in
-            if (self.pins[self.pinFlag].value == False): 
+            if (pinValue == False): 
                 # grounded by tip, aka connected
                 """
                 False/grounded, then this event is a plug-in
                 """
 
                 # === MISUSE DETECTION - Track plug-ins ===
-                current_time = qtc.QTime.currentTime()
-                self.plugin_history.append((current_time, self.pinFlag))
+                self.plugin_history.append(pinFlag, history.PLUG_IN)
                 
                 # Check for misuse
                 if self.checkForMisuse():
@@ -471,41 +629,38 @@ class MainWindow(qtw.QMainWindow):
 
                 # Send pin index to model.py as an int 
                 # Model uses signals for LED, text and pinsIn to set here
-                self.plugInToHandle.emit(self.pinFlag)
+                self.plugInToHandle.emit(pinFlag)
             # Unplug
             else: # pin flag True, still, or again, high
                 # aka not connected
                 # was this a legit unplug?
-                if (self.model.getIsPinIn(self.pinFlag)):
+                if (self.model.getIsPinIn(pinFlag)):
                     # if this pin was in
-                    print(f" * pin {self.pinFlag} was in - handleUnPlug")
+                    print(f" * pin {pinFlag} was in - handleUnPlug")
                     # On unplug we can't tell which line electronically 
                     # (diff in shaft is gone), so rely on pinsIn info
-                    self.unPlugToHandle.emit(self.pinFlag)
+                    self.unPlugToHandle.emit(pinFlag)
                     # Model handleUnPlug will set pinsIn false for this one
                 else:
                     print(" ** got to pin true (changed to high), but not pin in")
 
-        # Delay setting just_checked to false in case the plug is wiggled
-        qtc.QTimer.singleShot(150, self.delayedFinishCheck)
-
-    def delayedFinishCheck(self):
-        # This just delay resetting just_checked
-        print(" * delayed finished check \n")
-        self.just_checked = False
-
-        # Experimental
-        self.mcp.clear_ints()  # This seems to keep things fresh
-
     def displayText(self, msg):
         self.label.setText(msg)        
 
     def setLED(self, flagIdx, onOrOff):
-        self.pinsLed[flagIdx].value = onOrOff     
+        # People without an LED (or index 99, nobody) are ignored
+        ledBit = self.wiring.ledBit.get(flagIdx)
+        if ledBit is not None:
+            self.leds.set(ledBit, onOrOff)
 
     def blinker(self):
-        self.pinsLed[self.pinToBlink].value = not self.pinsLed[self.pinToBlink].value
-        # print("blinking value: " + str(self.pinsLed[self.pinToBlink].value))
+        # Toggle from the shadow copy - no read back from the chip
+        ledBit = self.wiring.ledBit.get(self.pinToBlink)
+        if ledBit is not None:
+            self.leds.toggle(ledBit)
+            # Straight out, so the bus profile can tell blinks from setLED
+            self.leds.flush('blinker')
+        # print("blinking value: " + str(self.leds.isOn(self.pinToBlink)))
         
     def startBlinker(self, personIdx):
         self.pinToBlink = personIdx
@@ -516,60 +671,28 @@ class MainWindow(qtw.QMainWindow):
             self.blinkTimer.stop()
 
     def setLEDsOff(self):
-        for pinIndex in range(0, 12):
-            self.setLED(pinIndex, False)
+        self.leds.allOff()
 
     def getAnyPinsIn(self):
-        anyPinsIn = False
-
-        for pinIndex in range(0, 12):
-            if self.pins[pinIndex].value == False:
-                anyPinsIn = True
-        return anyPinsIn
+        return self.portSnapshot.anyPinsIn(self.wiring.jackMask)
 
     def stopCaptions(self):
-        self.areCaptionsContinuing = False
-        self.captionTimer.stop()
-
-    def time_str_to_ms(self, time_str):
-        hours, minutes, seconds_ms = time_str.split(':')
-        seconds, milliseconds = seconds_ms.split(',')
-        return int(hours) * 3600000 + int(minutes) * 60000 + int(seconds) * 1000 + int(milliseconds)
-
-    # Mostly from ChatGPT
-    def displayCaptions(self, fileType, file_name):
-        with open('captions/' + fileType + '/' + file_name + '.srt', 'r') as f:
-            self.captions = f.read().split('\n\n')
-        self.areCaptionsContinuing = True
-        self.captionIndex = 0
-
-        self.display_next_caption()
-
-    def display_next_caption(self):
-        # print('got to display_next_caption')
-        # nonlocal self
-        if self.captionIndex < len(self.captions):
-            caption = self.captions[self.captionIndex]
-            # print(f'full entry: {caption}')
-            if '-->' in caption:
-                number, time, text = caption.split('\n', 2)
-                # print(f'#: {number} time: {time}, text: {text}')
-                # Stop if unplugged
-                if (self.areCaptionsContinuing):
-                    self.displayText(text)
-                # Process time
-                times = time.split(' --> ')
-                # print(f'times[0]: {times[0]}')
-                start_time_ms = self.time_str_to_ms(times[0])
-                end_time_ms = self.time_str_to_ms(times[1])
-                duration_ms = end_time_ms - start_time_ms
-                if (self.areCaptionsContinuing):
-                    self.captionTimer.start(duration_ms)
-            self.captionIndex += 1
+        self.captions.stop()
+
+    def displayCaptions(self, fileType, file_name, offsetMs=None):
+        # Cues are timed against the voice channel's clock, see captions.py.
+        # They start from where the clip is, or `offsetMs` into it
+        cues = self.captionLibrary.get(fileType, file_name)
+        if cues is None:
+            print(f"No captions for {fileType}/{file_name}")
+            self.captions.stop()
+            return
+        self.captions.start(cues, offsetMs)
 
 app = qtw.QApplication([])
 
 win = MainWindow()
 win.show()
+app.aboutToQuit.connect(win.shutdown)
 
 sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""Per-jack debouncing"""
+import time
+
+from PyQt5 import QtCore as qtc
+
+
+class PinDebouncer(qtc.QObject):
+    """Independent settle window per pin, confirmed by port samples.
+
+    edge() starts (or restarts) a pin's settle window. Once it has passed,
+    the pin needs `samplesNeeded` port samples in a row at the same level
+    to be confirmed. Any disagreement restarts the window. Pins settle in
+    parallel off the same samples, so two jacks changing together don't
+    hold each other up. pinConfirmed only fires when the confirmed level
+    differs from the last one, so a wiggled plug that ends where it began
+    produces nothing.
+    """
+    pinConfirmed = qtc.pyqtSignal(int, bool)  # pin, level (True = high, out)
+    SAMPLE_TIMEOUT_MS = 100
+
+    def __init__(self, requestSample, pinCount, settleMs=20, samplesNeeded=3,
+                 sampleMs=8, parent=None):
+        super().__init__(parent)
+        # requestSample() asks for a port read, the word comes back in sample()
+        self._requestSample = requestSample
+        self.pinCount = pinCount
+        self.settleMs = settleMs
+        self.samplesNeeded = samplesNeeded
+        self.sampleMs = sampleMs
+        # Confirmed levels, all out until resetLevels()
+        self._stable = [True] * pinCount
+        # pin -> [readyAt ms, candidate level, matching samples]
+        self._settling = {}
+        self._sampleOutstanding = False
+        self._requestedAt = 0
+        self._timer = qtc.QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._tick)
+
+    def resetLevels(self, word):
+        """Take confirmed levels straight from a port word, dropping any
+        pins in the middle of settling"""
+        self._settling.clear()
+        self._stable = [bool(word >> pin & 1) for pin in range(self.pinCount)]
+
+    def edge(self, pin, level):
+        now = time.monotonic() * 1000
+        self._settling[pin] = [now + self.settleMs, level, 0]
+        self._schedule(self.settleMs)
+
+    def sample(self, word):
+        self._sampleOutstanding = False
+        now = time.monotonic() * 1000
+        nextDue = []
+        for pin, state in list(self._settling.items()):
+            # A confirm handler may have reset everything
+            if pin not in self._settling:
+                continue
+            readyAt, candidate, matches = state
+            if now < readyAt:
+                nextDue.append(readyAt)
+                continue
+            level = bool(word >> pin & 1)
+            if level != candidate:
+                # Still bouncing, start this pin's window again
+                self._settling[pin] = [now + self.settleMs, level, 0]
+                nextDue.append(now + self.settleMs)
+            elif matches + 1 < self.samplesNeeded:
+                state[2] = matches + 1
+                nextDue.append(now + self.sampleMs)
+            else:
+                self._settling.pop(pin)
+                if level != self._stable[pin]:
+                    self._stable[pin] = level
+                    self.pinConfirmed.emit(pin, level)
+        if nextDue:
+            self._schedule(max(0, int(min(nextDue) - now)))
+
+    def _schedule(self, ms):
+        if not self._timer.isActive() or self._timer.remainingTime() > ms:
+            self._timer.start(ms)
+
+    def _tick(self):
+        if not self._settling:
+            return
+        now = time.monotonic() * 1000
+        # A lost read (bus error) mustn't stall every pin, so ask again
+        # if the last one has been out for a while
+        if (self._sampleOutstanding and
+                now - self._requestedAt < self.SAMPLE_TIMEOUT_MS):
+            self._schedule(self.sampleMs)
+            return
+        self._sampleOutstanding = True
+        self._requestedAt = now
+        self._requestSample()
+        # sample() reschedules when the read comes back; if it never does
+        # this tick asks again
+        self._schedule(self.SAMPLE_TIMEOUT_MS)
@@ -0,0 +1,56 @@
+"""Audio ends, handed to the main thread.
+
+Every channel posts its ends here, from the engine's thread, as
+(channel, event, token) on a deque - appends and pops need no lock - and
+wakes the main thread. There each end is matched against the channel:
+if its token is still the channel's, the clip that ended is the one last
+played, and the `then` given to play() is called. Anything older is
+stale and dropped, so a clip stopped or replaced just as it ended can't
+set off the next step.
+"""
+from collections import deque
+import time
+
+from PyQt5 import QtCore as qtc
+
+from latency import LatencyHistogram
+
+
+class Dispatcher(qtc.QObject):
+    _wake = qtc.pyqtSignal()
+
+    def __init__(self, channels, parent=None):
+        super().__init__(parent)
+        self._queue = deque()
+        self.dispatched = 0
+        self.stale = 0
+        self.unhandled = 0
+        self.delay = LatencyHistogram("audio end -> handler")
+        self._wake.connect(self._drain, qtc.Qt.QueuedConnection)
+        for channel in channels:
+            channel.postEndsTo(self.post)
+
+    def post(self, channel, event, token):
+        """Any thread"""
+        self._queue.append((channel, event, token, time.monotonic()))
+        self._wake.emit()
+
+    def _drain(self):
+        while self._queue:
+            channel, event, token, postedAt = self._queue.popleft()
+            if token != channel.token:
+                self.stale += 1
+                continue
+            then = channel.then
+            channel.then = None
+            if then is None:
+                self.unhandled += 1
+                continue
+            self.dispatched += 1
+            self.delay.add((time.monotonic() - postedAt) * 1000)
+            then()
+
+    def summary(self):
+        return (f"-- Audio ends: {self.dispatched} handled, {self.stale} stale, "
+                f"{self.unhandled} with nothing to do --\n"
+                f"{self.delay.summary()}")
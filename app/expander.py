@@ -0,0 +1,65 @@
+"""Register level access to the MCP23017 port expanders.
+
+The adafruit driver does one I2C transaction per property read, so
+walking `int_flag` and then `pins[n].value` costs a round trip per pin.
+These helpers talk to the chip's I2CDevice directly and fetch a whole
+block of registers in a single transaction.
+"""
+
+# Register addresses with IOCON.BANK = 0, so each A/B pair is adjacent
+# and, with IOCON.SEQOP = 0, a read keeps auto-incrementing through them.
+IODIRA = 0x00
+GPINTENA = 0x04
+DEFVALA = 0x06
+INTCONA = 0x08
+IOCON = 0x0A
+GPPUA = 0x0C
+INTFA = 0x0E
+INTCAPA = 0x10
+GPIOA = 0x12
+OLATA = 0x14
+
+
+def readBlock(mcp, register, length):
+    """Read `length` consecutive registers starting at `register`"""
+    buffer = bytearray(length)
+    with mcp._device as i2c:
+        i2c.write_then_readinto(bytes((register,)), buffer)
+    return buffer
+
+
+def readWord(mcp, register):
+    """Read an A/B register pair as one 16 bit word, port A in the low byte"""
+    data = readBlock(mcp, register, 2)
+    return data[0] | data[1] << 8
+
+
+def writeWord(mcp, register, value):
+    """Write an A/B register pair in one transaction"""
+    with mcp._device as i2c:
+        i2c.write(bytes((register, value & 0xFF, (value >> 8) & 0xFF)))
+
+
+def readInterruptState(mcp):
+    """INTF, INTCAP and GPIO for both ports in one burst.
+
+    INTFA..GPIOB are six consecutive registers, so this is a single
+    transaction. Reading INTCAP/GPIO also clears the interrupt.
+    Returns (intf, intcap, gpio) as 16 bit words.
+    """
+    data = readBlock(mcp, INTFA, 6)
+    return (data[0] | data[1] << 8,
+            data[2] | data[3] << 8,
+            data[4] | data[5] << 8)
+
+
+def changedPins(intf, gpio, previousGpio, pinCount=16):
+    """Decode an interrupt snapshot into a list of (pin, value) tuples.
+
+    A pin is reported if the chip flagged it, or if its level differs
+    from the last port word we saw -- the latter catches edges that
+    arrived while the interrupt was already asserted.
+    """
+    changed = intf | (gpio ^ previousGpio)
+    return [(pin, bool(gpio >> pin & 1))
+            for pin in range(pinCount) if changed >> pin & 1]
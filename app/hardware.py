@@ -0,0 +1,216 @@
+"""Switchboard I/O backends.
+
+control.py reaches the jacks, LEDs, start/stop buttons and the interrupt
+lines only through an IoBackend, picked at start up (settings.IO_BACKEND).
+The register work is shared: a backend is a list of input expanders, a
+list of LED expanders, each with an I2CDevice, and an interrupt line per
+INT pin, laid out by a wiring.Wiring. Mcp23017Backend builds them from
+the real bonnets, simulated.SimulatedBackend from software models.
+
+Port and LED words are wide: chip k of a kind is bits 16k to 16k + 15.
+Every read or write is one transaction per chip, never per pin.
+"""
+import subprocess
+import time
+
+import expander
+from wiring import chipWord, setChipWord
+
+
+class IoBackend:
+    """Jack inputs and buttons on N MCP23017s, LEDs on M more.
+
+    Everything except attachInterrupt and close is called from the bus
+    thread. Chips only need an I2CDevice style `_device`;
+    `interruptLines` maps INT pin -> line, and a line needs
+    attach(callback), isAsserted() and close().
+    """
+
+    def __init__(self, wiring, inputChips, ledChips, interruptLines):
+        self.wiring = wiring
+        self.inputChips = inputChips
+        self.ledChips = ledChips
+        self.interruptLines = interruptLines
+        # INT pin -> input chips that pull it low
+        self._chipsOnLine = wiring.chipsOnLine()
+
+    def configure(self):
+        """Pins, pull ups and the tip interrupt. Returns the jack port word."""
+        for chip in self.inputChips:
+            # Set to input with pull up - later will get interrupt as well.
+            # Done before reading so the jacks aren't floating.
+            expander.writeWord(chip, expander.IODIRA, 0xFFFF)
+            expander.writeWord(chip, expander.GPPUA, 0xFFFF)
+            # Enable Interrupts in all pins
+            expander.writeWord(chip, expander.GPINTENA, 0xFFFF)
+            # If intcon is set to 0's we will get interrupts on both
+            #  button presses and button releases
+            expander.writeWord(chip, expander.INTCONA, 0x0000)
+            # Interrupt as open drain and mirrored (same value in both IOCON copies)
+            expander.writeWord(chip, expander.IOCON, 0x4444)
+        for index, chip in enumerate(self.ledChips):
+            expander.writeWord(chip, expander.IODIRA, self.wiring.ledDirection(index))
+        self.clearInterrupts()
+        return self.readPort()
+
+    def chipsOnLine(self, channel):
+        return self._chipsOnLine.get(channel, [])
+
+    def readInterrupt(self, chip):
+        """(intf, intcap, gpio) for one input chip in one transaction"""
+        return expander.readInterruptState(self.inputChips[chip])
+
+    def readPort(self):
+        """Every input chip, as one wide word"""
+        word = 0
+        for index, chip in enumerate(self.inputChips):
+            word = setChipWord(word, index, expander.readWord(chip, expander.GPIOA))
+        return word
+
+    def writeLeds(self, word, chips=None):
+        """Write the LED chips listed (default all) from a wide LED word"""
+        if chips is None:
+            chips = range(len(self.ledChips))
+        for index in chips:
+            expander.writeWord(self.ledChips[index], expander.OLATA,
+                               chipWord(word, index))
+
+    def clearInterrupts(self):
+        # Reading INTCAP clears the interrupt
+        for chip in self.inputChips:
+            expander.readWord(chip, expander.INTCAPA)
+
+    def interruptAsserted(self, channel=None):
+        """Is the given INT line (default any) held low"""
+        if channel is not None:
+            return self.interruptLines[channel].isAsserted()
+        return any(line.isAsserted() for line in self.interruptLines.values())
+
+    def lastInputChange(self):
+        """monotonic() time a jack or button last really changed, if known"""
+        return None
+
+    def clockBusFree(self):
+        """Release a slave holding SDA low. Nothing to do by default."""
+
+    def reopen(self):
+        """Fresh chip objects after bus trouble; configure() must follow"""
+
+    def attachInterrupt(self, callback):
+        """callback(channel) is called from the interrupt line's own thread.
+        Lines can be attached again after close()."""
+        for line in self.interruptLines.values():
+            line.attach(callback)
+
+    def close(self):
+        for line in self.interruptLines.values():
+            line.close()
+
+
+class GpioInterruptLine:
+    """The expander's mirrored, open drain INT on a Pi GPIO pin"""
+
+    def __init__(self, pin=17, bouncetime=50):
+        from RPi import GPIO
+        self._gpio = GPIO
+        self.pin = pin
+        self.bouncetime = bouncetime
+        GPIO.setmode(GPIO.BCM)
+        # First remove any existing event detection
+        try:
+            GPIO.remove_event_detect(pin)
+        except:
+            pass  # Handle exception if no event detection exists
+        GPIO.setup(pin, GPIO.IN, GPIO.PUD_UP)
+
+    def attach(self, callback):
+        self._gpio.add_event_detect(self.pin, self._gpio.BOTH,
+            callback=callback, bouncetime=self.bouncetime)
+
+    def isAsserted(self):
+        # Active low
+        return self._gpio.input(self.pin) == self._gpio.LOW
+
+    def close(self):
+        try:
+            self._gpio.remove_event_detect(self.pin)
+        except:
+            pass
+
+
+class Mcp23017Backend(IoBackend):
+    """The Pi with the bonnets at the addresses in the wiring"""
+    # BCM numbers of the I2C1 pins
+    SDA_PIN = 2
+    SCL_PIN = 3
+
+    def __init__(self, wiring):
+        super().__init__(wiring, [], [],
+                         {pin: GpioInterruptLine(pin) for pin in wiring.chipsOnLine()})
+        self.i2c = None
+        self.reopen()
+
+    def reopen(self):
+        # Hardware libraries are only needed on the Pi
+        import board
+        import busio
+        from adafruit_mcp230xx.mcp23017 import MCP23017
+
+        self._releaseBus()
+        # Initialize the I2C bus:
+        self.i2c = busio.I2C(board.SCL, board.SDA)
+        self.inputChips = [MCP23017(self.i2c, address=a) for a in self.wiring.inputAddresses]
+        self.ledChips = [MCP23017(self.i2c, address=a) for a in self.wiring.ledAddresses]
+
+    def _releaseBus(self):
+        if self.i2c is not None:
+            try:
+                self.i2c.deinit()
+            except Exception:
+                pass
+            self.i2c = None
+
+    def clockBusFree(self):
+        """Clock SCL by hand until a chip stuck mid-byte lets go of SDA,
+        then send a STOP and hand the pins back to the I2C controller"""
+        from RPi import GPIO
+        self._releaseBus()
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(self.SDA_PIN, GPIO.IN, GPIO.PUD_UP)
+        GPIO.setup(self.SCL_PIN, GPIO.OUT, initial=GPIO.HIGH)
+        # Up to 9 clocks: a whole byte plus the ack
+        for _ in range(9):
+            if GPIO.input(self.SDA_PIN):
+                break
+            GPIO.output(self.SCL_PIN, GPIO.LOW)
+            time.sleep(0.00001)
+            GPIO.output(self.SCL_PIN, GPIO.HIGH)
+            time.sleep(0.00001)
+        # STOP: SDA rises while SCL is high
+        GPIO.setup(self.SDA_PIN, GPIO.OUT, initial=GPIO.LOW)
+        time.sleep(0.00001)
+        GPIO.output(self.SDA_PIN, GPIO.HIGH)
+        GPIO.cleanup((self.SDA_PIN, self.SCL_PIN))
+        # Back to ALT0 (I2C). pinctrl on current Pi OS, raspi-gpio before it
+        errors = []
+        for command in (["pinctrl", "set", "2,3", "a0"],
+                        ["raspi-gpio", "set", "2-3", "a0"]):
+            try:
+                subprocess.run(command, check=True, timeout=1,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                return
+            except (OSError, subprocess.SubprocessError) as e:
+                errors.append(f"{command[0]}: {e}")
+        # Left as plain GPIO the pins are cut off from the I2C controller
+        raise OSError("Couldn't give SDA/SCL back to I2C - " + "; ".join(errors))
+
+
+def createBackend(name, wiring):
+    if name == 'sim':
+        # Import here so the Pi never loads the simulator
+        import settings
+        from simulated import SimulatedBackend
+        return SimulatedBackend(wiring, latencyMs=settings.SIM_LATENCY_MS)
+    if name == 'mcp23017':
+        return Mcp23017Backend(wiring)
+    raise ValueError(f"Unknown I/O backend: {name}")
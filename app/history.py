@@ -0,0 +1,89 @@
+"""Fixed size history of jack edges"""
+from array import array
+import time
+
+# Edge values, matching the pin level after the edge
+PLUG_IN = 0
+UNPLUG = 1
+
+
+def nowMs():
+    return time.monotonic() * 1000
+
+
+class EdgeHistory:
+    """Ring buffer of (time ms, pin, edge, processed) records.
+
+    Storage is preallocated arrays, so appending never allocates and the
+    oldest records are simply overwritten once `capacity` is reached.
+    Records are always appended in time order, which lets countSince()
+    bisect instead of filtering. Index 0 is the oldest record held.
+    """
+    __slots__ = ('capacity', '_times', '_pins', '_edges', '_processed',
+                 '_next', '_count')
+
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self._times = array('d', bytes(8 * capacity))
+        self._pins = array('b', bytes(capacity))
+        self._edges = array('b', bytes(capacity))
+        self._processed = array('b', bytes(capacity))
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _slot(self, index):
+        return (self._next - self._count + index) % self.capacity
+
+    def append(self, pin, edge, timeMs=None):
+        slot = self._next
+        self._times[slot] = nowMs() if timeMs is None else timeMs
+        self._pins[slot] = pin
+        self._edges[slot] = edge
+        self._processed[slot] = 0
+        self._next = (slot + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def clear(self):
+        self._count = 0
+
+    def record(self, index):
+        slot = self._slot(index)
+        return (self._times[slot], self._pins[slot], self._edges[slot],
+                bool(self._processed[slot]))
+
+    def countSince(self, sinceMs):
+        """How many records are at or after sinceMs"""
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if self._times[self._slot(mid)] < sinceMs:
+                low = mid + 1
+            else:
+                high = mid
+        return self._count - low
+
+    def recent(self, withinMs, now=None):
+        """Records from the last withinMs, newest first, as (index, record)"""
+        cutoff = (nowMs() if now is None else now) - withinMs
+        for index in range(self._count - 1, -1, -1):
+            record = self.record(index)
+            if record[0] < cutoff:
+                break
+            yield index, record
+
+    def markProcessed(self, pin):
+        """Mark the oldest unprocessed record for pin. False if there was none."""
+        for index in range(self._count):
+            slot = self._slot(index)
+            if self._pins[slot] == pin and not self._processed[slot]:
+                self._processed[slot] = 1
+                return True
+        return False
+
+    def last(self, n):
+        """The newest n records, oldest first"""
+        return [self.record(index)
+                for index in range(max(0, self._count - n), self._count)]
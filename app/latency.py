@@ -0,0 +1,114 @@
+"""Plug event latency instrumentation.
+
+Each stage of a plug event is stamped with time.monotonic(), measured
+from the interrupt that started the event, and collected per stage in a
+histogram. dump() gives a text report.
+"""
+import threading
+import time
+
+# Histogram bucket upper bounds in ms, anything above the last is overflow
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 300, 500, 1000, 2000, 5000)
+
+
+class LatencyHistogram:
+    """Fixed bucket histogram of millisecond values"""
+
+    def __init__(self, name, bucketsMs=BUCKETS_MS):
+        self.name = name
+        self.bucketsMs = bucketsMs
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.bucketsMs) + 1)
+        self.count = 0
+        self.totalMs = 0.0
+        self.minMs = None
+        self.maxMs = None
+
+    def add(self, ms):
+        index = 0
+        while index < len(self.bucketsMs) and ms > self.bucketsMs[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.totalMs += ms
+        self.minMs = ms if self.minMs is None else min(self.minMs, ms)
+        self.maxMs = ms if self.maxMs is None else max(self.maxMs, ms)
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the pct'th value"""
+        if not self.count:
+            return None
+        target = self.count * pct / 100
+        running = 0
+        for index, bucketCount in enumerate(self.counts):
+            running += bucketCount
+            if running >= target:
+                if index < len(self.bucketsMs):
+                    return self.bucketsMs[index]
+                return self.maxMs
+        return self.maxMs
+
+    def summary(self):
+        if not self.count:
+            return f"{self.name:<24} no samples"
+        return (f"{self.name:<24} n={self.count:<5} "
+                f"mean={self.totalMs / self.count:8.1f} "
+                f"min={self.minMs:8.1f} p50<={self.percentile(50):>6} "
+                f"p90<={self.percentile(90):>6} max={self.maxMs:8.1f} ms")
+
+
+class PlugLatency:
+    """Stage timestamps for the plug event currently in flight.
+
+    begin() is called at the interrupt callback; mark(stage) from any
+    thread afterwards. Each stage is recorded once per event, both since
+    the interrupt and since the stage before it. Marks more than
+    MAX_EVENT_MS after the interrupt belong to something else.
+    """
+    MAX_EVENT_MS = 5000
+    STAGES = (
+        'main_thread',      # handlePortChange on the Qt thread
+        'debounced',        # PinDebouncer confirming the pin, continueCheckPin
+        'handle_plug_in',   # Model.handlePlugIn
+        'led_write',        # LED latch written on the bus
+        'audio_playing',    # Audio engine reports the clip playing
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._origin = None
+        self._previous = None
+        self._seen = set()
+        self.sinceInterrupt = {stage: LatencyHistogram(stage) for stage in self.STAGES}
+        self.sincePrevious = {stage: LatencyHistogram(stage) for stage in self.STAGES}
+
+    def begin(self):
+        with self._lock:
+            self._origin = self._previous = time.monotonic()
+            self._seen.clear()
+
+    def mark(self, stage):
+        now = time.monotonic()
+        with self._lock:
+            if self._origin is None or stage in self._seen:
+                return
+            if (now - self._origin) * 1000 > self.MAX_EVENT_MS:
+                return
+            self._seen.add(stage)
+            self.sinceInterrupt[stage].add((now - self._origin) * 1000)
+            self.sincePrevious[stage].add((now - self._previous) * 1000)
+            self._previous = now
+
+    def dump(self):
+        with self._lock:
+            lines = ["-- Plug latency, since interrupt --"]
+            lines += [self.sinceInterrupt[stage].summary() for stage in self.STAGES]
+            lines.append("-- Plug latency, since previous stage --")
+            lines += [self.sincePrevious[stage].summary() for stage in self.STAGES]
+        return "\n".join(lines)
+
+
+# Shared by control.py (interrupt side) and model.py (audio side)
+plugLatency = PlugLatency()
@@ -0,0 +1,65 @@
+"""Shadow-buffered driver for the LED port expanders"""
+from PyQt5 import QtCore as qtc
+
+from wiring import chipsIn
+
+
+class LedDriver(qtc.QObject):
+    """Keeps a copy of the LED ports (OLAT) in memory.
+
+    The word spans every LED expander, 16 bits per chip (see wiring.py).
+    Changes made during one pass of the Qt event loop are collected and
+    written out together by flush(), so a run of setLEDSignal emits turns
+    into one OLAT write per chip that changed. Reading an LED never
+    touches the bus.
+    """
+
+    def __init__(self, writeLatch, chipCount=1, parent=None):
+        super().__init__(parent)
+        # writeLatch(word, chips, name) does the actual register writes
+        self._writeLatch = writeLatch
+        self.chipCount = chipCount
+        self._shadow = 0
+        # What the chip holds, None forces the next flush to write
+        self._written = None
+        self._flushQueued = False
+
+    def set(self, idx, onOrOff):
+        if onOrOff:
+            self._shadow |= 1 << idx
+        else:
+            self._shadow &= ~(1 << idx)
+        self._queueFlush()
+
+    def toggle(self, idx):
+        self._shadow ^= 1 << idx
+        self._queueFlush()
+
+    def isOn(self, idx):
+        return bool(self._shadow >> idx & 1)
+
+    def allOff(self):
+        self._shadow = 0
+        self._queueFlush()
+
+    def invalidate(self):
+        """Chip state unknown (e.g. after reconfiguring), rewrite on next flush"""
+        self._written = None
+        self._queueFlush()
+
+    def _queueFlush(self):
+        if not self._flushQueued:
+            self._flushQueued = True
+            # Zero timeout: runs once the current event has been handled
+            qtc.QTimer.singleShot(0, self.flush)
+
+    def flush(self, name='setLED'):
+        """Write out changed chips now. name tags the bus command."""
+        self._flushQueued = False
+        if self._written is None:
+            chips = list(range(self.chipCount))
+        else:
+            chips = chipsIn(self._shadow ^ self._written)
+        if chips:
+            self._writeLatch(self._shadow, chips, name)
+            self._written = self._shadow
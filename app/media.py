@@ -0,0 +1,60 @@
+"""Pre-loaded VLC media for every clip the switchboard plays.
+
+Clips are named as in conversations.json and persons.json, without the
+directory or .mp3 extension. Each vlc.Media is created and parsed once,
+so a play is just set_media() on an object that's already been probed.
+"""
+import os
+import time
+
+import vlc
+
+
+class MediaCache:
+    """vlc.Media by clip name, parsed up front.
+
+    Clips whose file isn't there at start up are tried again the first
+    time they're asked for, so audio can be copied on while running.
+    """
+
+    def __init__(self, instance, audioDir, names=()):
+        self._instance = instance
+        self.audioDir = audioDir
+        self._media = {}
+        self.hits = 0
+        self.misses = 0
+        self.missing = []
+        started = time.monotonic()
+        for name in names:
+            if os.path.exists(self.path(name)):
+                self._media[name] = self._load(name)
+            else:
+                self.missing.append(name)
+        self.buildMs = (time.monotonic() - started) * 1000
+        if self.missing:
+            print(f"Audio clips not found, will retry when played: {self.missing}")
+
+    def path(self, name):
+        return os.path.join(self.audioDir, name + ".mp3")
+
+    def _load(self, name):
+        media = self._instance.media_new_path(self.path(name))
+        # Probe now, on libVLC's own thread, rather than at the first play
+        media.parse_with_options(vlc.MediaParseFlag.local, 0)
+        return media
+
+    def get(self, name):
+        media = self._media.get(name)
+        if media is not None:
+            self.hits += 1
+            return media
+        self.misses += 1
+        media = self._load(name)
+        if os.path.exists(self.path(name)):
+            self._media[name] = media
+        return media
+
+    def summary(self):
+        return (f"-- Media cache: {len(self._media)} clips loaded in "
+                f"{self.buildMs:.1f} ms, {self.hits} hits, {self.misses} misses, "
+                f"{len(self.missing)} missing at start up --")
@@ -3,7 +3,12 @@ import json
 from PyQt5 import QtWidgets as qtw
 from PyQt5 import QtGui as qtg
 from PyQt5 import QtCore as qtc
-import vlc
+
+from audio import createEngine
+from dispatch import Dispatcher
+from sequencer import Sequencer, clipNames
+from latency import LatencyHistogram, plugLatency
+import settings
 
 conversationsJsonFile = open('conversations.json')
 conversations = json.load(conversationsJsonFile)
@@ -30,34 +35,46 @@ class Model(qtc.QObject):
     setTimeToNextSignal = qtc.pyqtSignal(int)
     # setTimeToEndSignal = qtc.pyqtSignal(int)
     setTimeToEndSignal = qtc.pyqtSignal()
-    playRequestCorrectSignal = qtc.pyqtSignal()
-    
-    # NEW: Thread-safe signals for VLC callbacks
-    endOperatorOnlySignal = qtc.pyqtSignal()
-    playFullConvoSignal = qtc.pyqtSignal(int)  # currConvo
-    setCallCompletedSignal = qtc.pyqtSignal()
-    playFullWrongNumSignal = qtc.pyqtSignal(int)  # pluggedPersonIdx
-    startPlayRequestCorrectThreadSignal = qtc.pyqtSignal()
-    restartOnTimeoutSignal = qtc.pyqtSignal()
-    restartOnEndTimeoutSignal = qtc.pyqtSignal()
-
-    buzzInstace = vlc.Instance()
-    buzzPlayer = buzzInstace.media_player_new()
-    buzzPlayer.set_media(buzzInstace.media_new_path("/home/piswitch/Apps/sb-audio/buzzer.mp3"))
-    buzzEvents = buzzPlayer.event_manager()
-
-    toneInstace = vlc.Instance()
-    tonePlayer = toneInstace.media_player_new()
-    toneEvents = tonePlayer.event_manager()
-    toneMedia = toneInstace.media_new_path("/home/piswitch/Apps/sb-audio/outgoing-ring.mp3")
-    tonePlayer.set_media(toneMedia)
-
-    vlcInstance = vlc.Instance()
-    vlcPlayer = vlcInstance.media_player_new()
-    vlcEvent = vlcPlayer.event_manager()
-
-    def __init__(self):
+    # Audio ends come back to the main thread through self.dispatcher
+
+
+    def __init__(self, engine=None):
         super().__init__()
+        # Every clip loaded up front, a channel per role. See audio.py
+        if engine is None:
+            engine = createEngine(settings.AUDIO_ENGINE, settings.AUDIO_DIR,
+                clipNames(conversations, persons))
+        self.audio = engine
+
+        self.buzzer = self.audio.channel('buzzer')
+        self.buzzer.load("buzzer")
+
+        self.tone = self.audio.channel('tone')
+        self.tone.load("outgoing-ring")
+
+        # voice is whichever voice channel is current, the other one
+        # is where the clip after the ring tone is armed (see armVoice)
+        self.voices = [self.audio.channel('voice', 0), self.audio.channel('voice', 1)]
+        self.voice = self.voices[0]
+        self._armed = None
+        self._armedName = None
+        # Ring end -> voice audio, for clips chained after the tone
+        self._chainPending = False
+        self.chainGap = LatencyHistogram("ring -> voice gap")
+        # Calls each clip's `then` in the main thread when it ends
+        self.dispatcher = Dispatcher(self.audio.channels())
+        # Every clip's step, and the handler for when it ends, worked out once
+        self.sequencer = Sequencer(conversations, persons, {
+            'noAnswer': self.handleRestartOnTimeout,
+            'operatorOnlyEnded': self.handleEndOperatorOnly,
+            'ringEnded': self.handlePlayFullConvo,
+            'callCompleted': self.handleSetCallCompleted,
+            'wrongRingEnded': self.handlePlayFullWrongNum,
+            'wrongNumEnded': self.playRequestCorrect,
+            'welcomeEnded': self.afterWelcome,
+            'finished': self.handleRestartOnEndTimeout,
+        })
+
         self.callInitTimer = qtc.QTimer()
         self.callInitTimer.setSingleShot(True)
         self.callInitTimer.timeout.connect(self.initiateCall)
@@ -74,21 +91,15 @@ class Model(qtc.QObject):
         # self.resetEndTimer.timeout.connect(self.stopSimSignal.emit())
         self.resetEndTimer.timeout.connect(self.resetAtEnd)
 
-        self.playRequestCorrectSignal.connect(self.playRequestCorrect)
         self.setTimeToEndSignal.connect(self.startEndTimer)
 
         # signal calls timer directly
         # self.checkDualUnplugSignal.connect(self.dualUnplugTimer.start)
         # self.dualUnplugTimer.timeout.connect(self.checkDualUnplug)
-        
-        # NEW: Connect thread-safe VLC signals to their handlers
-        self.endOperatorOnlySignal.connect(self.handleEndOperatorOnly)
-        self.playFullConvoSignal.connect(self.handlePlayFullConvo)
-        self.setCallCompletedSignal.connect(self.handleSetCallCompleted)
-        self.playFullWrongNumSignal.connect(self.handlePlayFullWrongNum)
-        self.startPlayRequestCorrectThreadSignal.connect(self.handleStartPlayRequestCorrect)
-        self.restartOnTimeoutSignal.connect(self.handleRestartOnTimeout)
-        self.restartOnEndTimeoutSignal.connect(self.handleRestartOnEndTimeout)
+
+        # Last stage of plug latency - these stay attached for good
+        for channel in self.audio.channels():
+            channel.onPlaying(self.markPlaying, channel)
 
         self.reset()
 
@@ -98,7 +109,8 @@ class Model(qtc.QObject):
 
         # Put pinsIn here in model where it's used more often
         # rather than in control which would require a lot of signaling.
-        self.pinsIn = [False,False,False,False,False,False,False,False,False,False,False,False,False,False]
+        # One per person, whether or not the board has a jack for them.
+        self.pinsIn = [False] * len(persons)
         
         self.currConvo = 0
         self.currCallerIndex = 0
@@ -141,10 +153,56 @@ class Model(qtc.QObject):
         # if self.callInitTimer.isActive():
         #     self.callInitTimer.stop()
 
-        self.buzzPlayer.stop()
-        self.tonePlayer.stop()
+        self.buzzer.stop()
+        self.tone.stop()
         # self.vlcPlayers[0].stop()
-        self.vlcPlayer.stop()
+        self.voice.stop()
+        self.disarmVoice()
+
+    def play(self, step):
+        """Start a step on its own channel, the voice clip on the current voice"""
+        channel = {'buzzer': self.buzzer, 'tone': self.tone}.get(step.role, self.voice)
+        if channel is self.voice:
+            self.disarmVoice()
+        channel.load(step.clip)
+        channel.play(step.then)
+
+    def armVoice(self, step):
+        """Cue a voice step on the spare voice channel. Chained after the ring
+        tone, it starts as the tone ends with nothing left to load."""
+        self.disarmVoice()
+        spare = self.voices[1] if self.voice is self.voices[0] else self.voices[0]
+        self._armed = spare
+        self._armedName = step.clip
+        spare.cue(step.clip)
+
+    def disarmVoice(self):
+        self._chainPending = False
+        if self._armed is not None:
+            self._armed.stop()
+            self._armed = None
+            self._armedName = None
+
+    def playRing(self, ring, next):
+        """Ring tone, straight into the `next` voice step"""
+        self.armVoice(next)
+        self._chainPending = True
+        self.tone.load(ring.clip)
+        self.tone.play(ring.then, chain=self._armed)
+
+    def playVoice(self, step):
+        """Play a voice step. If it's the armed one, the armed channel
+        (already started if the ring ran out) becomes the voice channel."""
+        if self._armed is not None and self._armedName == step.clip:
+            armed = self._armed
+            self._armed = None
+            self._armedName = None
+            armed.resume(step.then)
+            previous = self.voice
+            self.voice = armed
+            previous.stop()
+            return
+        self.play(step)
 
     def setPinIn(self, pinIdx, value):
         self.pinsIn[pinIdx] = value
@@ -170,10 +228,8 @@ class Model(qtc.QObject):
             # be when user plugs in a plug 
             # buzzTrack.volume = .6   
 
-            self.buzzEvents.event_attach(vlc.EventType.MediaPlayerEndReached, 
-                self.restartOnTimeout) 
-
-            self.buzzPlayer.play()
+            # Nobody answered - start over
+            self.play(self.sequencer.convo(self.currConvo).buzz)
             self.blinkerStart.emit(conversations[self.currConvo]["caller"]["index"])
             self.displayTextSignal.emit("Incoming call..")
             
@@ -186,37 +242,19 @@ class Model(qtc.QObject):
 
     def playHello(self, _currConvo): # , lineIndex
         # print(" -- got to playHello")
-        media = self.vlcInstance.media_new_path("/home/piswitch/Apps/sb-audio/" + 
-            conversations[_currConvo]["helloFile"] + ".mp3")
-        self.vlcPlayer.set_media(media)
-        # For convo idxs 3 and 7 there is no full convo, so end after hello.
-        # Attach event before playing
-        if (_currConvo == 3 or  _currConvo == 8):
-            print(f" -- got to currConv = 3 or 8 -- Operator only ")
+        sequence = self.sequencer.convo(_currConvo)
+        # For convo idxs 3 and 8 there is no full convo, so end after hello.
+        if sequence.operatorOnly:
+            print(f" -- got to currConv {_currConvo} -- Operator only ")
             # Set call status to operator only
             self.phoneLine["unPlugStatus"] = self.OP_ONLY_IN_PROGRESS
-            self.vlcEvent.event_attach(vlc.EventType.MediaPlayerEndReached, 
-                self.endOperatorOnlyHello) #  _currConvo, 
 
-        # Proceed with playing -- event may or may not be attached            
-        self.vlcPlayer.play()
+        # Proceed with playing -- the hello step knows what comes after
+        self.play(sequence.hello)
         # Send msg to screen
         self.displayCaptionSignal.emit('hello', conversations[_currConvo]["helloFile"])
 
 
-    def endOperatorOnlyHello(self, event): # , lineIndex
-        """VLC callback - must be thread-safe"""
-        print("  - VLC callback endOperatorOnlyHello - emitting signal")
-        
-        if event != None:
-            try:
-                self.vlcEvent.event_detach(vlc.EventType.MediaPlayerEndReached)
-            except:
-                pass
-        
-        # Emit signal to main thread
-        self.endOperatorOnlySignal.emit()
-
     def handleEndOperatorOnly(self):
         """Handle operator-only ending in main thread"""
         print("  - handleEndOperatorOnly in main thread")
@@ -238,90 +276,29 @@ class Model(qtc.QObject):
         This just plays the outgoing tone and then starts the full convo
         """
         print(f" -- got to play convo, currConvo: {currConvo}")
-        # Store currConvo for later use
-        self._pendingConvo = currConvo
-        # Long VLC way of creating callback
-        self.toneEvents.event_attach(vlc.EventType.MediaPlayerEndReached, 
-            self.playFullConvo) # Now without currConvo parameter
-        self.tonePlayer.set_media(self.toneMedia)
-        self.tonePlayer.play()
-
-    def playFullConvo(self, event):
-        """VLC callback - must be thread-safe"""
-        if event != None:
-            try:
-                self.toneEvents.event_detach(vlc.EventType.MediaPlayerEndReached)
-            except:
-                pass
-        
-        # Emit signal with stored currConvo
-        self.playFullConvoSignal.emit(self._pendingConvo)
+        sequence = self.sequencer.convo(currConvo)
+        # Convo waits, paused, on the other voice channel
+        self.playRing(sequence.ring, sequence.convo)
 
     def handlePlayFullConvo(self, _currConvo):
         """Handle playing full conversation in main thread"""
         print(f" -- PlayFullConvo {_currConvo}")
-        # Set callback for convo track finish
-        self.vlcEvent.event_attach(vlc.EventType.MediaPlayerEndReached, 
-            self.setCallCompleted)
-        media = self.vlcInstance.media_new_path("/home/piswitch/Apps/sb-audio/" + 
-            conversations[_currConvo]["convoFile"] + ".mp3")
-        self.vlcPlayer.set_media(media)
-        self.vlcPlayer.play()
+        # Call's complete when the convo track finishes
+        self.playVoice(self.sequencer.convo(_currConvo).convo)
         self.displayCaptionSignal.emit('convo', conversations[_currConvo]["convoFile"])
 
     def playWrongNum(self, pluggedPersonIdx): # , lineIndex
         print(f" -- [2] got to play wrong number, currConvo: {self.currConvo}")
-        # Store pluggedPersonIdx for later use
-        self._pendingPluggedPerson = pluggedPersonIdx
-        # Long VLC way of creating callback
-        self.toneEvents.event_attach(vlc.EventType.MediaPlayerEndReached, 
-            self.playFullWrongNum)
-        self.tonePlayer.set_media(self.toneMedia)
-        self.tonePlayer.play()
-
-    def playFullWrongNum(self, event): # , lineIndex
-        """VLC callback - must be thread-safe"""
-        print("  - About to detach toneEvent in playFullWrongNum")
-        
-        if event != None:
-            try:
-                self.toneEvents.event_detach(vlc.EventType.MediaPlayerEndReached)
-            except:
-                pass
-        
-        # Emit signal with stored pluggedPersonIdx
-        self.playFullWrongNumSignal.emit(self._pendingPluggedPerson)
+        self.playRing(*self.sequencer.wrongNum(pluggedPersonIdx))
 
     def handlePlayFullWrongNum(self, pluggedPersonIdx):
         """Handle playing wrong number in main thread"""
         self.displayTextSignal.emit(persons[pluggedPersonIdx]["wrongNumText"])
 
         print(f"  -- Play Wrong Num person {pluggedPersonIdx}")
-        # Set callback for wrongNum track finish
-        self.vlcEvent.event_attach(vlc.EventType.MediaPlayerEndReached, 
-            self.startPlayRequestCorrect)
-        
-        media = self.vlcInstance.media_new_path("/home/piswitch/Apps/sb-audio/" + 
-            persons[pluggedPersonIdx]["wrongNumFile"] + ".mp3")
-        self.vlcPlayer.set_media(media)
-        self.vlcPlayer.play()
-
-    def startPlayRequestCorrect(self, event): # , lineIndex
-        """VLC callback - must be thread-safe"""
-        print("  - About to detach vlcEvent in startPlayRequestCorrect")
-
-        if event is not None:
-            try:
-                self.vlcEvent.event_detach(vlc.EventType.MediaPlayerEndReached)
-            except:
-                pass
-
-        # Emit signal to main thread
-        self.startPlayRequestCorrectThreadSignal.emit()
-
-    def handleStartPlayRequestCorrect(self):
-        """Handle request correct in main thread"""
-        self.playRequestCorrectSignal.emit()
+        # Caller asks again for the right person when it finishes
+        ring, wrongNum = self.sequencer.wrongNum(pluggedPersonIdx)
+        self.playVoice(wrongNum)
 
     # Reply from caller saying who caller really wants
     def playRequestCorrect(self):
@@ -329,33 +306,17 @@ class Model(qtc.QObject):
         # Transcript for correction
         self.displayTextSignal.emit(conversations[self.currConvo]["retryAfterWrongText"])
 
-        print("  - About to detach vlcEvent in PlayRequestCorrect")
-        self.vlcEvent.event_detach(vlc.EventType.MediaPlayerEndReached) 
-
-        media = self.vlcInstance.media_new_path("/home/piswitch/Apps/sb-audio/" + 
-            conversations[self.currConvo]["retryAfterWrongFile"] + ".mp3")
-        
-        self.vlcPlayer.set_media(media)
-        self.vlcPlayer.play()
+        self.play(self.sequencer.convo(self.currConvo).retry)
         # At this point we hope user unplugs wrong number
         # Will be handled by "unPlug"
 
     def playFinished(self):
-        self.toneEvents.event_detach(vlc.EventType.MediaPlayerEndReached)         
+        self.tone.cancel()
 
         self.displayTextSignal.emit("Congratulations -- you finished your first shift as a switchboard operator!")
         # print(f"-- PlayFullConvo {_currConvo}, lineIndex: {lineIndex}")
 
-        media = self.vlcInstance.media_new_path("/home/piswitch/Apps/sb-audio/" + 
-            "FinishedActivity.mp3")
-        self.vlcEvent.event_detach(vlc.EventType.MediaPlayerEndReached)
-
-        self.vlcPlayer.set_media(media)
-
-        self.vlcEvent.event_attach(vlc.EventType.MediaPlayerEndReached, 
-            self.restartOnEndTimeout) 
-
-        self.vlcPlayer.play()
+        self.play(self.sequencer.finished)
 
     # def setTimeToNext(self, timeToWait):
     #     self.callInitTimer.start(timeToWait)   
@@ -376,6 +337,7 @@ class Model(qtc.QObject):
     def handlePlugIn(self, personIdx):
         """triggered by control.py
         """
+        plugLatency.mark('handle_plug_in')
         print(f' - Start handlePlugIn, personIdx: {personIdx}'
               f' is caller plugged: {self.phoneLine["caller"]["isPlugged"]}')
         # ********
@@ -401,7 +363,7 @@ class Model(qtc.QObject):
 
                 # See software app for extended debug message here
                 # Stop Buzzer. 
-                self.buzzPlayer.stop()
+                self.buzzer.stop()
                 # Blinker handled in control.py
                 self.blinkerStop.emit()
 
@@ -415,7 +377,7 @@ class Model(qtc.QObject):
                     if (self.phoneLine["callee"]["isPlugged"] == True):
                         # if (correct callee??)
                         # Stop Hello/Request
-                        self.vlcPlayer.stop()
+                        self.voice.stop()
                         # set line engaged
                         self.phoneLine["unPlugStatus"] = self.NO_UNPLUG_STATUS
                         self.phoneLine["isEngaged"] = True
@@ -455,7 +417,7 @@ class Model(qtc.QObject):
                 self.setPinIn(personIdx, True)
                 # Stop the hello operator track,  whether this is the correct
                 # callee or not
-                self.vlcPlayer.stop()
+                self.voice.stop()
                 # Also stop captions
                 self.stopCaptionSignal.emit()
 
@@ -498,11 +460,11 @@ class Model(qtc.QObject):
             # If conversation is in progress -- engaged (implies correct callee)
             print(f'  - Unplugging a call in progress person id: {persons[personIdx]["name"]} ' )
             # Get stop time
-            stopTime = self.vlcPlayer.get_time()
+            stopTime = self.voice.timeMs()
             # print(f'  -- stop time: {stopTime}')
 
             # Stop the audio
-            self.vlcPlayer.stop()
+            self.voice.stop()
             # Stop subtitles
             self.stopCaptionSignal.emit()
             # Clear Transcript 
@@ -565,11 +527,11 @@ class Model(qtc.QObject):
                 # Correct caller unplugging?
                 if (personIdx == self.phoneLine["caller"]["index"]):
                     print("     caller unplugged")
-                    stopTime = self.vlcPlayer.get_time()
-                    self.vlcPlayer.stop() 
+                    stopTime = self.voice.timeMs()
+                    self.voice.stop() 
                     #  LED handled by either condition below
                     # If this is a hello only call # And if we're close enough to the end
-                    if ((self.currConvo == 3 or  self.currConvo == 8) and
+                    if (self.sequencer.convo(self.currConvo).operatorOnly and
                         stopTime > conversations[self.currConvo]["okTimeHello"]):
                         # Close enough to end, move on 
                         print(f'  - stopped operator only caller with time: {stopTime}')
@@ -583,7 +545,7 @@ class Model(qtc.QObject):
                     print(f' -- |2| Unplug on wrong number, personIdx: {personIdx}')
 
                     # Don't stop the request for the right number so soon
-                    # self.vlcPlayer.stop() 
+                    # self.voice.stop() 
 
                     # Cover for before personidx defined
                     if (personIdx < 99):
@@ -613,11 +575,11 @@ class Model(qtc.QObject):
         print(f" - handleDualUnplug: pins {pin1} and {pin2} unplugged together during active call")
         
         # Get stop time before stopping audio
-        stopTime = self.vlcPlayer.get_time()
+        stopTime = self.voice.timeMs()
         print(f"  - Dual unplug at time: {stopTime}")
         
         # Stop the audio immediately
-        self.vlcPlayer.stop()
+        self.voice.stop()
         
         # Stop subtitles
         self.stopCaptionSignal.emit()
@@ -655,18 +617,6 @@ class Model(qtc.QObject):
     #     # Timer will call 
     #     self.dualUnplugTimer.start(90)
 
-    def setCallCompleted(self, event=None): #, _currConvo, lineIndex
-        """VLC callback - must be thread-safe"""
-        # Disable callback if present
-        if event != None:
-            try:
-                self.vlcEvent.event_detach(vlc.EventType.MediaPlayerEndReached)
-            except:
-                pass
-        
-        # Emit signal to main thread
-        self.setCallCompletedSignal.emit()
-
     def handleSetCallCompleted(self):
         """Handle call completion in main thread"""
         print(f" -- setCallCompleted. Convo: {self.currConvo}")
@@ -706,46 +656,19 @@ class Model(qtc.QObject):
         """Just for startup
         """
         print(" - got to model.handleStart")
-        # Set callback for welcome track finish
-        self.vlcEvent.event_attach(vlc.EventType.MediaPlayerEndReached, 
-            self.afterWelcome)  
-        media = self.vlcInstance.media_new_path("/home/piswitch/Apps/sb-audio/Welcome.mp3")
-        self.vlcPlayer.set_media(media)
-        self.vlcPlayer.play()
+        self.play(self.sequencer.welcome)
         # self.displayCaptionSignal.emit('convo', conversations[_currConvo]["convoFile"])
         self.displayTextSignal.emit("Welcome to the switchboard game. \nIt's your turn to be a switchboard operator! \nHere comes the first call.")
 
-    def afterWelcome(self, event):
+    def afterWelcome(self):
         self.setTimeToNextSignal.emit(1000) # calls setTimeToNext
 
-    def restartOnTimeout(self, event):
-        """VLC callback - must be thread-safe"""
-        print(' - auto starting reset (VLC callback)')
-        try:
-            self.buzzEvents.event_detach(vlc.EventType.MediaPlayerEndReached)
-        except:
-            pass
-        
-        # Emit signal to main thread
-        self.restartOnTimeoutSignal.emit()
-
     def handleRestartOnTimeout(self):
         """Handle restart in main thread"""
         print(' - handling restart in main thread')
         self.blinkerStop.emit()
         self.stopSimSignal.emit()
 
-    def restartOnEndTimeout(self, event):
-        """VLC callback - must be thread-safe"""
-        print(' - Starting reset after End (VLC callback)')
-        try:
-            self.vlcEvent.event_detach(vlc.EventType.MediaPlayerEndReached)
-        except:
-            pass
-
-        # Emit signal to main thread
-        self.restartOnEndTimeoutSignal.emit()
-
     def handleRestartOnEndTimeout(self):
         """Handle restart after end in main thread"""
         # This signal will call startEndTimer
@@ -759,19 +682,16 @@ class Model(qtc.QObject):
         # Maybe this could go directly in callback?
         self.stopSimSignal.emit()
 
+    def markPlaying(self, event, channel):
+        """Audio callback"""
+        if channel.paused:
+            return  # Armed clip opening, still paused
+        if self._chainPending and channel in self.voices:
+            self._chainPending = False
+            self.chainGap.add((channel.playingAt - self.tone.endedAt) * 1000)
+        plugLatency.mark('audio_playing')
+
     def detachAllEventHandlers(self):
-        # Detach all VLC event handlers
-        try:
-            self.buzzEvents.event_detach(vlc.EventType.MediaPlayerEndReached)
-        except:
-            pass
-        
-        try:
-            self.toneEvents.event_detach(vlc.EventType.MediaPlayerEndReached)
-        except:
-            pass
-        
-        try:
-            self.vlcEvent.event_detach(vlc.EventType.MediaPlayerEndReached)
-        except:
-            pass
\ No newline at end of file
+        # Nothing more to happen when clips end
+        for channel in self.audio.channels():
+            channel.cancel()
@@ -0,0 +1,370 @@
+"""Pre-decoded PCM through one audio stream that's never closed.
+
+Every clip is decoded to 16 bit stereo at RATE by ffmpeg at start up, so
+play() only points a channel at bytes already in memory. One writer
+thread mixes whatever channels are playing into PERIOD_FRAMES periods and
+writes them to the sink. With nothing playing it writes silence, so the
+output is never reopened, and a play() is heard within a period or two.
+Channel callbacks are called from the writer thread. With a PcmCache,
+decoding happens once per source file rather than once per start up.
+
+Needs ffmpeg to decode, and pyalsaaudio for AlsaSink.
+"""
+import os
+import shutil
+import subprocess
+import threading
+import time
+import warnings
+import wave
+from array import array
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        import audioop
+except ImportError:
+    # Gone from Python 3.13, mixing falls back to _mixSlow
+    audioop = None
+
+from audio import AudioEngine, Channel, rssKb
+
+RATE = 44100
+CHANNELS = 2
+SAMPLE_BYTES = 2
+FRAME_BYTES = CHANNELS * SAMPLE_BYTES
+# 10 ms periods - how long a play() can wait to be mixed in
+PERIOD_FRAMES = 441
+PERIOD_BYTES = PERIOD_FRAMES * FRAME_BYTES
+SILENCE = bytes(PERIOD_BYTES)
+
+
+def decode(path):
+    """Raw interleaved s16le frames of an audio file"""
+    return subprocess.run(
+        ['ffmpeg', '-v', 'error', '-i', path, '-f', 's16le',
+         '-ac', str(CHANNELS), '-ar', str(RATE), '-'],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+
+
+def bytesToMs(nbytes):
+    return nbytes // FRAME_BYTES * 1000 // RATE
+
+
+class PcmClips:
+    """Decoded PCM by clip name, decoded up front.
+
+    Without a cache the PCM is held in memory. With a PcmCache, start up
+    only makes sure each clip's PCM is on disk, and it's memory-mapped the
+    first time the clip is played.
+
+    Like media.MediaCache, clips missing at start up are tried again the
+    first time they're asked for. One that can't be decoded plays as
+    silence of no length, so it ends straight away.
+    """
+
+    def __init__(self, audioDir, names=(), cache=None):
+        self.audioDir = audioDir
+        self.cache = cache
+        self.canDecode = shutil.which('ffmpeg') is not None
+        if not self.canDecode:
+            print("ffmpeg not found, audio clips not already decoded will be silent")
+        self._pcm = {}
+        # Clip name -> cache key, for clips on disk but not mapped yet
+        self._keys = {}
+        self.hits = 0
+        self.misses = 0
+        self.missing = []
+        started = time.monotonic()
+        for name in names:
+            if not os.path.exists(self.path(name)):
+                self.missing.append(name)
+            elif cache is None:
+                self._pcm[name] = self._decode(self.path(name))
+            else:
+                self._keys[name] = cache.prepare(self.path(name), self._decode)
+        if cache is not None:
+            cache.evict(keep=set(self._keys.values()))
+            cache.save()
+        self.buildMs = (time.monotonic() - started) * 1000
+        if self.missing:
+            print(f"Audio clips not found, will retry when played: {self.missing}")
+
+    def path(self, name):
+        return os.path.join(self.audioDir, name + ".mp3")
+
+    def _decode(self, path):
+        if not self.canDecode:
+            return b''
+        try:
+            return decode(path)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Couldn't decode audio clip {path}: {e}")
+            return b''
+
+    def _load(self, name):
+        if self.cache is None:
+            return self._decode(self.path(name))
+        key = self._keys.pop(name, None)
+        pcm = None
+        if key is not None:
+            try:
+                pcm = self.cache.map(key)
+            except FileNotFoundError:
+                # Cleared from under us, decode it again
+                pass
+        if pcm is None:
+            try:
+                key = self.cache.prepare(self.path(name), self._decode)
+            except OSError:
+                return b''
+            if key is None:
+                return b''
+            pcm = self.cache.map(key)
+            # Mapped already, so it stays readable even if it's evicted
+            self.cache.evict(keep=set(self._keys.values()) | {key})
+        # Keep the play time for eviction
+        self.cache.save()
+        return pcm
+
+    def get(self, name):
+        pcm = self._pcm.get(name)
+        if pcm is not None:
+            self.hits += 1
+            return pcm
+        if name not in self._keys:
+            self.misses += 1
+        pcm = self._load(name)
+        if pcm:
+            self._pcm[name] = pcm
+        return pcm
+
+    def summary(self):
+        totalBytes = sum(len(pcm) for pcm in self._pcm.values())
+        where = "in memory" if self.cache is None else "mapped"
+        lines = [f"-- PCM clips: {len(self._pcm) + len(self._keys)} ready in "
+                 f"{self.buildMs:.1f} ms, {len(self._pcm)} {where}, {totalBytes // 1024} kB, "
+                 f"{bytesToMs(totalBytes) / 1000:.1f} s of audio, "
+                 f"{self.hits} hits, {self.misses} misses, "
+                 f"{len(self.missing)} missing at start up --"]
+        if self.cache is not None:
+            lines.append(self.cache.summary())
+        return "\n".join(lines)
+
+
+class PcmChannel(Channel):
+    """State is shared with the writer thread, under the engine's lock"""
+
+    def __init__(self, engine):
+        super().__init__()
+        self._engine = engine
+        self._lock = engine.lock
+        self._pcm = memoryview(b'')
+        self._pos = 0
+        self.playing = False
+        # Playing callbacks not yet called for this play
+        self.started = False
+
+    def load(self, name):
+        pcm = memoryview(self._engine.clips.get(name))
+        with self._lock:
+            self.clip = name
+            self._pcm = pcm
+            self._pos = 0
+            self.playing = False
+
+    def play(self, then=None, chain=None):
+        with self._lock:
+            # Under the lock, so an end the writer is about to report
+            # carries the token of the clip that really ended
+            self._begin(then, chain)
+            self._pos = 0
+            self.playing = True
+            self.paused = False
+            self.started = False
+
+    def cue(self, name):
+        self.load(name)
+        with self._lock:
+            self._begin()
+            self.playing = True
+            self.paused = True
+            self.started = False
+
+    def resume(self, then=None):
+        if then is not None:
+            self.then = then
+        with self._lock:
+            self.paused = False
+
+    def stop(self):
+        with self._lock:
+            self._begin()
+            self.playing = False
+            self._pos = 0
+
+    def timeMs(self):
+        with self._lock:
+            return bytesToMs(self._pos) if self.playing else -1
+
+    def take(self):
+        """Next period's worth, and whether that's the end of the clip.
+        Writer thread only, with the lock held."""
+        chunk = self._pcm[self._pos:self._pos + PERIOD_BYTES]
+        self._pos += len(chunk)
+        ended = self._pos >= len(self._pcm)
+        if ended:
+            self.playing = False
+            self._pos = 0
+        return chunk, ended
+
+    def fireEnd(self, token):
+        self._ended(self, token)
+
+    def firePlaying(self):
+        self._playing(self)
+
+
+class AlsaSink:
+    """The ALSA device, opened once for the life of the process"""
+
+    def __init__(self, device='default'):
+        import alsaaudio
+        self.device = device
+        self._pcm = alsaaudio.PCM(alsaaudio.PCM_PLAYBACK, alsaaudio.PCM_NORMAL,
+            device=device, channels=CHANNELS, rate=RATE,
+            format=alsaaudio.PCM_FORMAT_S16_LE, periodsize=PERIOD_FRAMES, periods=4)
+
+    def write(self, period):
+        # Blocks while the device buffer is full, which paces the writer
+        self._pcm.write(period)
+
+    def close(self):
+        self._pcm.close()
+
+
+class NullSink:
+    """Keeps real time without a sound card. Written to a WAV file if
+    there's a path, otherwise dropped."""
+
+    def __init__(self, path=None):
+        self.device = path or 'null'
+        self._wav = None
+        if path:
+            self._wav = wave.open(path, 'wb')
+            self._wav.setnchannels(CHANNELS)
+            self._wav.setsampwidth(SAMPLE_BYTES)
+            self._wav.setframerate(RATE)
+        self._next = time.monotonic()
+
+    def write(self, period):
+        if self._wav is not None:
+            self._wav.writeframes(period)
+        self._next += PERIOD_FRAMES / RATE
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            # Fell behind, don't try to catch up
+            self._next = time.monotonic()
+
+    def close(self):
+        if self._wav is not None:
+            self._wav.close()
+
+
+def _mixSlow(chunks):
+    mixed = array('h', bytes(PERIOD_BYTES))
+    for chunk in chunks:
+        samples = array('h', bytes(chunk))
+        for i, sample in enumerate(samples):
+            mixed[i] = max(-32768, min(32767, mixed[i] + sample))
+    return mixed.tobytes()
+
+
+def mix(chunks):
+    """One full period from each playing channel's chunk"""
+    if len(chunks) == 1:
+        chunk = chunks[0]
+        if len(chunk) == PERIOD_BYTES:
+            return chunk
+        return bytes(chunk) + SILENCE[len(chunk):]
+    if audioop is None:
+        return _mixSlow(chunks)
+    mixed = SILENCE
+    for chunk in chunks:
+        padded = bytes(chunk) + SILENCE[len(chunk):]
+        mixed = audioop.add(mixed, padded, SAMPLE_BYTES)
+    return mixed
+
+
+class PcmEngine(AudioEngine):
+    """Pre-decoded clips mixed into one always open sink"""
+    name = 'pcm'
+
+    def __init__(self, audioDir, names, sink, cache=None):
+        super().__init__()
+        rssBefore = rssKb()
+        self.clips = PcmClips(audioDir, names, cache)
+        self.clipsKb = rssKb() - rssBefore
+        self.sink = sink
+        self.lock = threading.Lock()
+        self.periods = 0
+        self.mixedPeriods = 0
+        self.lateWrites = 0
+        self._addChannels(lambda role: PcmChannel(self))
+        self._running = True
+        self._writer = threading.Thread(target=self._run, name='pcm-writer', daemon=True)
+        self._writer.start()
+
+    def _run(self):
+        while self._running:
+            started, ended, chunks = [], [], []
+            with self.lock:
+                for channel in self.channels():
+                    if not channel.playing or channel.paused:
+                        continue
+                    chunk, atEnd = channel.take()
+                    if chunk:
+                        chunks.append(chunk)
+                    if not channel.started:
+                        channel.started = True
+                        started.append(channel)
+                    if atEnd:
+                        ended.append((channel, channel.token))
+                period = mix(chunks) if chunks else SILENCE
+            # Callbacks may well call back into a channel, so not under the lock
+            for channel in started:
+                channel.firePlaying()
+            writeStarted = time.monotonic()
+            self.sink.write(period)
+            # A write that blocks for more than two periods means we'd
+            # fallen behind, and the device will have run dry
+            if time.monotonic() - writeStarted > 2 * PERIOD_FRAMES / RATE:
+                self.lateWrites += 1
+            self.periods += 1
+            if len(chunks) > 1:
+                self.mixedPeriods += 1
+            for channel, token in ended:
+                channel.fireEnd(token)
+
+    def close(self):
+        super().close()
+        self._running = False
+        self._writer.join()
+        self.sink.close()
+
+    def summary(self):
+        return (f"{super().summary()}\n"
+                f"-- PCM out to {self.sink.device}: {self.periods} periods of "
+                f"{PERIOD_FRAMES} frames, {self.mixedPeriods} mixed, "
+                f"{self.lateWrites} late; clips RSS {self.clipsKb} kB --\n"
+                f"{self.clips.summary()}")
+
+
+class NullEngine(PcmEngine):
+    """PcmEngine into a NullSink, for running without a sound card"""
+    name = 'null'
+
+    def __init__(self, audioDir, names=(), path=None, cache=None):
+        super().__init__(audioDir, names, NullSink(path), cache)
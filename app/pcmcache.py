@@ -0,0 +1,143 @@
+"""Decoded clips kept on disk between runs.
+
+Each source file is decoded once to raw PCM in the cache directory,
+named by the SHA-1 of the source, and memory-mapped when it's first
+played. manifest.json remembers each source's size, mtime and SHA-1 so
+an unchanged file isn't hashed again; a changed one is hashed and
+decoded afresh, and its old PCM goes if nothing else uses it. The
+directory is kept under a byte budget by dropping the PCM files least
+recently played.
+"""
+import hashlib
+import json
+import mmap
+import os
+import time
+
+MANIFEST = 'manifest.json'
+
+
+def sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PcmCache:
+    """Raw PCM files by source checksum"""
+
+    def __init__(self, cacheDir, budgetBytes):
+        self.cacheDir = cacheDir
+        self.budgetBytes = budgetBytes
+        os.makedirs(cacheDir, exist_ok=True)
+        # source path -> {"size", "mtime", "sha1"}
+        self._sources = {}
+        # sha1 -> {"bytes", "lastUsed"}
+        self._entries = {}
+        self._loadManifest()
+        self.hits = 0
+        self.decoded = 0
+        self.evicted = 0
+
+    def _manifestPath(self):
+        return os.path.join(self.cacheDir, MANIFEST)
+
+    def _pcmPath(self, key):
+        return os.path.join(self.cacheDir, key + '.pcm')
+
+    def _loadManifest(self):
+        try:
+            with open(self._manifestPath()) as f:
+                manifest = json.load(f)
+            self._sources = manifest['sources']
+            self._entries = manifest['entries']
+        except (OSError, ValueError, KeyError):
+            return
+        # Forget anything whose file has gone
+        for key in [key for key in self._entries
+                    if not os.path.exists(self._pcmPath(key))]:
+            del self._entries[key]
+
+    def save(self):
+        tmpPath = self._manifestPath() + '.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump({'sources': self._sources, 'entries': self._entries}, f)
+        os.replace(tmpPath, self._manifestPath())
+
+    def _key(self, path):
+        """SHA-1 of a source, only hashed again when its size or mtime moves"""
+        stat = os.stat(path)
+        source = self._sources.get(path)
+        if source and source['size'] == stat.st_size and source['mtime'] == stat.st_mtime:
+            return source['sha1']
+        key = sha1(path)
+        self._sources[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': key}
+        if source and source['sha1'] != key:
+            self._dropIfUnused(source['sha1'])
+        return key
+
+    def _dropIfUnused(self, key):
+        if any(source['sha1'] == key for source in self._sources.values()):
+            return
+        self._remove(key)
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        try:
+            os.remove(self._pcmPath(key))
+        except FileNotFoundError:
+            pass
+
+    def prepare(self, path, decode):
+        """Make sure the PCM for a source is on disk, `decode(path)`-ing it
+        if not. Returns its key, or None if it couldn't be decoded."""
+        key = self._key(path)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+        else:
+            pcm = decode(path)
+            if not pcm:
+                return None
+            tmpPath = self._pcmPath(key) + '.tmp'
+            with open(tmpPath, 'wb') as f:
+                f.write(pcm)
+            os.replace(tmpPath, self._pcmPath(key))
+            # Counts as used, or a fresh decode could be the first to go
+            self._entries[key] = {'bytes': len(pcm), 'lastUsed': time.time()}
+            self.decoded += 1
+        return key
+
+    def map(self, key):
+        """The PCM read-only and memory-mapped, b'' if it's empty. This is
+        what counts as a use for eviction."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry['lastUsed'] = time.time()
+        with open(self._pcmPath(key), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def totalBytes(self):
+        return sum(entry['bytes'] for entry in self._entries.values())
+
+    def evict(self, keep=()):
+        """Least recently used first, until under budget. Keys in `keep`
+        are the ones this run wants and go last."""
+        total = self.totalBytes()
+        for key in sorted(self._entries, key=lambda key: (
+                key in keep, self._entries[key].get('lastUsed', 0))):
+            if total <= self.budgetBytes:
+                break
+            total -= self._entries[key]['bytes']
+            # Anything already mapped stays readable until unmapped
+            self._remove(key)
+            self.evicted += 1
+
+    def summary(self):
+        return (f"-- PCM cache {self.cacheDir}: {len(self._entries)} files, "
+                f"{self.totalBytes() // (1 << 20)} of {self.budgetBytes // (1 << 20)} MB, "
+                f"{self.hits} hits, {self.decoded} decoded, {self.evicted} evicted --")
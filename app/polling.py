@@ -0,0 +1,83 @@
+"""Polling input mode, and cost counters for both input modes"""
+import time
+
+from latency import LatencyHistogram
+
+
+class InputStats:
+    """CPU time and detection latency for one input mode.
+
+    Detection latency is from the pin actually changing to the change
+    being handed on. The simulator knows when that was; on the Pi the
+    best we have is the interrupt callback (interrupt mode) or the
+    previous sample (polling mode, an upper bound).
+    """
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.startedAt = time.monotonic()
+        self.samples = 0
+        self.changes = 0
+        self.cpuS = 0.0
+        self.detect = LatencyHistogram(f"{mode} detect")
+
+    def add(self, cpuS, latencyMs=None):
+        self.samples += 1
+        self.cpuS += cpuS
+        if latencyMs is not None:
+            self.changes += 1
+            self.detect.add(latencyMs)
+
+    def summary(self):
+        wallS = time.monotonic() - self.startedAt
+        return (f"-- Input mode: {self.mode}, {self.samples} reads "
+                f"({self.samples / wallS:.0f}/s), {self.changes} changes, "
+                f"CPU {self.cpuS * 1000:.0f} ms = "
+                f"{100 * self.cpuS / wallS:.2f}% of one core --\n"
+                f"{self.detect.summary()}")
+
+
+class PortPoller:
+    """Samples the jack port at a fixed rate and reports changed pins.
+
+    poll() runs on the bus thread (see BusWorker.startPolling). Changes go
+    to onChange(interrupt_data, word) in the same (pin, value) form that
+    serviceInterrupt produces, so everything downstream is shared.
+    """
+
+    def __init__(self, readPort, onChange, rateHz, lastInputChange=None,
+                 pinCount=16):
+        self._readPort = readPort
+        self._onChange = onChange
+        # Optional: when the pin really changed (the simulator knows)
+        self._lastInputChange = lastInputChange
+        self.rateHz = rateHz
+        self.pinCount = pinCount
+        self.stats = InputStats(f"poll {rateHz} Hz")
+        # No baseline until the port has been configured, see rebase()
+        self.lastWord = None
+        self.lastSampleAt = None
+
+    def rebase(self, word):
+        """New baseline, e.g. after the expander has been (re)configured"""
+        self.lastWord = word
+        self.lastSampleAt = time.monotonic()
+
+    def poll(self):
+        if self.lastWord is None:
+            return
+        cpuStart = time.thread_time()
+        word = self._readPort()
+        sampledAt = time.monotonic()
+        latencyMs = None
+        changed = word ^ self.lastWord
+        if changed:
+            changedAt = self._lastInputChange() if self._lastInputChange else None
+            if changedAt is None:
+                changedAt = self.lastSampleAt
+            latencyMs = (sampledAt - changedAt) * 1000
+            self._onChange([(pin, bool(word >> pin & 1))
+                            for pin in range(self.pinCount) if changed >> pin & 1], word)
+        self.lastWord = word
+        self.lastSampleAt = sampledAt
+        self.stats.add(time.thread_time() - cpuStart, latencyMs)
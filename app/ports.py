@@ -0,0 +1,65 @@
+"""In-memory view of the jack input port.
+
+A jack's tip grounds its pin when a plug is in, so a 0 bit means "in".
+The word spans every input expander (see wiring.py).
+"""
+import threading
+import time
+
+
+class PortSnapshot:
+    """One GPIO read that answers questions about every pin.
+
+    The owner reads the port on the bus thread and feeds each word in
+    with update(); the last word is used as is. isFresh() says whether
+    it's recent enough, within `maxAgeMs`, to go without another read.
+    """
+
+    def __init__(self, maxAgeMs=20, allHigh=0xFFFF):
+        self.maxAgeMs = maxAgeMs
+        self._lock = threading.Lock()
+        # (word, monotonic ms) kept together so readers never see a mix
+        self._state = (allHigh, None)
+
+    def update(self, word):
+        with self._lock:
+            self._state = (word, time.monotonic() * 1000)
+
+    def isFresh(self):
+        stamp = self._state[1]
+        return (stamp is not None and
+                time.monotonic() * 1000 - stamp <= self.maxAgeMs)
+
+    def word(self):
+        """Last port word fed in"""
+        return self._state[0]
+
+    def isPinIn(self, pin):
+        return not self.word() >> pin & 1
+
+    def anyPinsIn(self, mask=0x0FFF):
+        """Any of the pins in mask grounded"""
+        return (~self.word() & mask) != 0
+
+    def diff(self, pinsIn, bits=None):
+        """Compare against a list of believed states (e.g. model.pinsIn).
+
+        bits[i] is the port bit for pinsIn[i] (None to skip it), by default
+        the same as i. Returns (pluggedIn, unplugged): indexes that are
+        physically in but believed out, and ones believed in that are
+        physically out.
+        """
+        word = self.word()
+        if bits is None:
+            bits = range(len(pinsIn))
+        pluggedIn = []
+        unplugged = []
+        for pin, (believedIn, bit) in enumerate(zip(pinsIn, bits)):
+            if bit is None:
+                continue
+            isIn = not word >> bit & 1
+            if isIn and not believedIn:
+                pluggedIn.append(pin)
+            elif believedIn and not isIn:
+                unplugged.append(pin)
+        return pluggedIn, unplugged
@@ -0,0 +1,124 @@
+"""Bringing the I2C bus back without restarting the exhibit"""
+import time
+
+from PyQt5 import QtCore as qtc
+
+from busworker import BusWorker
+from latency import LatencyHistogram
+
+
+class BusRecovery(qtc.QObject):
+    """Watches for a wedged bus and runs the recovery sequence.
+
+    Trouble is either ERROR_THRESHOLD bus command failures inside
+    ERROR_WINDOW_MS, or the INT line held low for STUCK_INT_MS even after
+    being serviced. Recovery itself is `recoverBus()`, run on the bus thread
+    ahead of anything else queued; it returns a fresh port word, which goes
+    to `onRecovered(word)` back in the main thread. All of this lives in the
+    main thread except recoverBus.
+    """
+    ERROR_THRESHOLD = 3
+    ERROR_WINDOW_MS = 2000
+    WATCHDOG_MS = 250
+    STUCK_INT_MS = 1000
+    # Attempts per recovery, and the wait before trying a failed one again
+    ATTEMPTS = 3
+    RETRY_MS = 1000
+
+    def __init__(self, bus, recoverBus, onRecovered, interruptAsserted=None,
+                 serviceInterrupt=None, parent=None):
+        super().__init__(parent)
+        self._bus = bus
+        self._recoverBus = recoverBus
+        self._onRecovered = onRecovered
+        # Stuck INT watchdog, only used in interrupt input mode
+        self._interruptAsserted = interruptAsserted
+        self._serviceInterrupt = serviceInterrupt
+        self._errorTimes = []
+        self._stuckSince = None
+        self.recovering = False
+        self.recoveries = 0
+        self.failures = 0
+        self.lastReason = None
+        self.duration = LatencyHistogram("bus recovery")
+        self._watchdog = qtc.QTimer()
+        self._watchdog.timeout.connect(self._watch)
+
+    def start(self):
+        if self._interruptAsserted is not None:
+            self._watchdog.start(self.WATCHDOG_MS)
+
+    def stop(self):
+        self._watchdog.stop()
+
+    def busError(self, name, error):
+        """A bus command failed (BusWorker.commandFailed)"""
+        if name == 'recover':
+            # The recovery itself failed - give the bus a moment
+            self.failures += 1
+            print(f" *** Bus recovery failed: {error}, retrying")
+            qtc.QTimer.singleShot(self.RETRY_MS, self._retry)
+            return
+        if self.recovering:
+            return
+        now = time.monotonic() * 1000
+        self._errorTimes = [t for t in self._errorTimes
+                            if now - t < self.ERROR_WINDOW_MS]
+        self._errorTimes.append(now)
+        if len(self._errorTimes) >= self.ERROR_THRESHOLD:
+            self.recover(f"{len(self._errorTimes)} bus errors, last in {name}: {error}")
+
+    def recover(self, reason):
+        if self.recovering:
+            return
+        print(f" *** Recovering I2C bus: {reason}")
+        self.recovering = True
+        self.lastReason = reason
+        self._errorTimes = []
+        self._stuckSince = None
+        self._submit()
+
+    def _retry(self):
+        self._submit()
+
+    def _submit(self):
+        # Ahead of the port reads that will be failing too
+        self._bus.submit(BusWorker.RECOVER, 'recover', self._runRecovery,
+            callback=self._finished)
+
+    def _runRecovery(self):
+        """Runs on the bus thread"""
+        started = time.monotonic()
+        for attempt in range(self.ATTEMPTS):
+            try:
+                word = self._recoverBus()
+                break
+            except Exception:
+                if attempt == self.ATTEMPTS - 1:
+                    raise
+        return word, (time.monotonic() - started) * 1000
+
+    def _finished(self, result):
+        word, ms = result
+        self.recovering = False
+        self.recoveries += 1
+        self.duration.add(ms)
+        print(f" *** I2C bus recovered in {ms:.1f} ms")
+        self._onRecovered(word)
+
+    def _watch(self):
+        if self.recovering or not self._interruptAsserted():
+            self._stuckSince = None
+            return
+        now = time.monotonic() * 1000
+        if self._stuckSince is None:
+            # Could just be a missed edge - service it once first
+            self._stuckSince = now
+            self._serviceInterrupt()
+        elif now - self._stuckSince >= self.STUCK_INT_MS:
+            self.recover(f"INT line stuck low for {now - self._stuckSince:.0f} ms")
+
+    def summary(self):
+        return (f"-- Bus recoveries: {self.recoveries}, failed attempts: "
+                f"{self.failures}, last reason: {self.lastReason} --\n"
+                f"{self.duration.summary()}")
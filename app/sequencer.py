@@ -0,0 +1,70 @@
+"""What plays, on which channel, and what happens when it ends.
+
+Every clip the switchboard plays is a Step, worked out once at start up
+from conversations.json and persons.json. A Step carries its role (which
+channel), its clip and `then`, the Model handler to run when it plays
+through - already bound to its conversation or person - so starting a
+clip is a lookup rather than deciding what comes next. Channels report
+their ends once for good (see dispatch.py), and the step's `then` is what
+the dispatcher calls.
+"""
+from collections import namedtuple
+from functools import partial
+
+Step = namedtuple('Step', 'role clip then')
+
+# Clips played by name below rather than from the JSON files
+FIXED_CLIPS = ('Welcome', 'FinishedActivity', 'buzzer', 'outgoing-ring')
+
+
+def clipNames(conversations, persons):
+    """Every clip the JSON files refer to, plus the fixed ones, in order.
+    Empty names (no convo, no wrong number clip) aren't clips."""
+    names = []
+    for convo in conversations:
+        names += [convo["helloFile"], convo["convoFile"], convo["retryAfterWrongFile"]]
+    names += [person["wrongNumFile"] for person in persons]
+    names += FIXED_CLIPS
+    return list(dict.fromkeys(name for name in names if name))
+
+
+class ConvoSequence:
+    """The steps of one conversation, in the order they can play"""
+
+    def __init__(self, index, conversation, routes):
+        self.index = index
+        # No full convo, the call ends after the hello
+        self.operatorOnly = not conversation["convoFile"]
+        self.buzz = Step('buzzer', 'buzzer', routes['noAnswer'])
+        self.hello = Step('voice', conversation["helloFile"],
+            routes['operatorOnlyEnded'] if self.operatorOnly else None)
+        self.ring = Step('tone', 'outgoing-ring', partial(routes['ringEnded'], index))
+        self.convo = Step('voice', conversation["convoFile"], routes['callCompleted'])
+        # The caller asks again, what happens next is up to the unplug
+        self.retry = Step('voice', conversation["retryAfterWrongFile"], None)
+
+
+class Sequencer:
+    """Steps for every conversation and wrong number.
+
+    `routes` names Model's handlers: noAnswer, operatorOnlyEnded,
+    ringEnded(convo), callCompleted, wrongRingEnded(person),
+    wrongNumEnded, welcomeEnded and finished.
+    """
+
+    def __init__(self, conversations, persons, routes):
+        self.welcome = Step('voice', 'Welcome', routes['welcomeEnded'])
+        self.finished = Step('voice', 'FinishedActivity', routes['finished'])
+        self.convos = [ConvoSequence(index, conversation, routes)
+                       for index, conversation in enumerate(conversations)]
+        # person -> (ring tone, wrong number clip)
+        self.wrongNums = [
+            (Step('tone', 'outgoing-ring', partial(routes['wrongRingEnded'], index)),
+             Step('voice', person["wrongNumFile"], routes['wrongNumEnded']))
+            for index, person in enumerate(persons)]
+
+    def convo(self, index):
+        return self.convos[index]
+
+    def wrongNum(self, person):
+        return self.wrongNums[person]
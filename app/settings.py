@@ -0,0 +1,35 @@
+"""Start up options.
+
+Read from the environment so the kiosk launcher, or a shell on a dev
+machine, can pick them without code changes.
+"""
+import os
+
+# Where the mp3 clips named in conversations.json and persons.json live
+AUDIO_DIR = os.environ.get('SB_AUDIO_DIR', '/home/piswitch/Apps/sb-audio')
+# 'vlc', 'pcm' for decoded clips through one open ALSA stream, or 'null'
+# to play into SB_AUDIO_SINK_FILE (a WAV) or nowhere. See audio.py
+AUDIO_ENGINE = os.environ.get('SB_AUDIO_ENGINE', 'vlc')
+AUDIO_DEVICE = os.environ.get('SB_AUDIO_DEVICE', 'default')
+AUDIO_SINK_FILE = os.environ.get('SB_AUDIO_SINK_FILE')
+# Where the pcm and null engines keep decoded clips, and how many MB
+# they can take. An empty SB_PCM_CACHE decodes into memory every start
+PCM_CACHE_DIR = os.environ.get('SB_PCM_CACHE', os.path.expanduser('~/.cache/switchboard-pcm'))
+PCM_CACHE_MB = int(os.environ.get('SB_PCM_CACHE_MB', '1024'))
+# <type>/<clip name>.srt for the hello and convo clips
+CAPTION_DIR = os.environ.get('SB_CAPTION_DIR', 'captions')
+# Every caption file compiled into one, rebuilt when an .srt changes.
+# Empty compiles them in memory every start
+CAPTION_CACHE = os.environ.get('SB_CAPTION_CACHE', os.path.join(CAPTION_DIR, 'captions.cache'))
+
+# 'mcp23017' for the real bonnets, 'sim' for the software model
+IO_BACKEND = os.environ.get('SB_IO_BACKEND', 'mcp23017')
+# Expander addresses and which pin is whose jack and LED, see wiring.py
+WIRING_FILE = os.environ.get('SB_WIRING', 'wiring.json')
+# Delay added to every simulated I2C transaction
+SIM_LATENCY_MS = float(os.environ.get('SB_SIM_LATENCY_MS', '0.4'))
+
+# 'interrupt' to read the jacks on the expander's INT line, 'poll' to
+# sample them from the bus thread SB_POLL_HZ times a second
+INPUT_MODE = os.environ.get('SB_INPUT_MODE', 'interrupt')
+POLL_HZ = int(os.environ.get('SB_POLL_HZ', '500'))
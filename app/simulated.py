@@ -0,0 +1,289 @@
+"""Software model of the switchboard hardware.
+
+Lets the full control/model stack run on a plain Linux box: one
+MCP23017 model per input and LED expander in wiring.json, behind a fake
+I2C bus with a configurable per-transaction delay, and an interrupt line
+per INT pin the wiring names, calling back from its own thread like
+RPi.GPIO does. Jacks and buttons are driven with plug()/unplug()/press(),
+by their bit in the wide port word.
+"""
+import queue
+import threading
+import time
+
+import expander
+import hardware
+from wiring import PINS_PER_CHIP, setChipWord
+
+
+class SimulatedBus:
+    """Serialises transactions and charges each one `latencyMs`"""
+
+    def __init__(self, latencyMs=0.4):
+        self.latencyMs = latencyMs
+        self.lock = threading.Lock()
+        self.transactions = 0
+        # A chip holding SDA low: every transaction fails until clocked free
+        self.wedged = False
+
+
+class _SimulatedDevice:
+    """Enough of adafruit's I2CDevice for the expander helpers"""
+
+    def __init__(self, chip, bus):
+        self._chip = chip
+        self._bus = bus
+
+    def __enter__(self):
+        self._bus.lock.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self._bus.lock.release()
+        return False
+
+    def _transaction(self):
+        if self._bus.wedged:
+            raise OSError(121, "Remote I/O error")
+        self._bus.transactions += 1
+        if self._bus.latencyMs:
+            time.sleep(self._bus.latencyMs / 1000)
+
+    def write(self, buf, start=0, end=None):
+        self._transaction()
+        data = bytes(buf[start:end])
+        self._chip.writeRegisters(data[0], data[1:])
+
+    def write_then_readinto(self, out_buffer, in_buffer, out_start=0,
+                            out_end=None, in_start=0, in_end=None):
+        self._transaction()
+        register = out_buffer[out_start]
+        if in_end is None:
+            in_end = len(in_buffer)
+        in_buffer[in_start:in_end] = self._chip.readRegisters(
+            register, in_end - in_start)
+
+
+class SimulatedMcp23017:
+    """Register model of an MCP23017 in BANK = 0, sequential mode.
+
+    Only what the switchboard uses: direction, pull ups, interrupt on
+    change with INTF/INTCAP, mirrored INT, and the output latch.
+    """
+
+    def __init__(self, bus, onInterruptChange=None):
+        self._device = _SimulatedDevice(self, bus)
+        self._onInterruptChange = onInterruptChange
+        self._lock = threading.RLock()
+        self.registers = bytearray(0x16)
+        # Power on: all inputs
+        self.registers[expander.IODIRA] = 0xFF
+        self.registers[expander.IODIRA + 1] = 0xFF
+        # Pins pulled to ground by a plug tip or button
+        self.grounded = 0
+        self.lastLevels = self.levels()
+        # When a pin last changed, for detection latency
+        self.lastChangeAt = None
+
+    def _word(self, register):
+        return self.registers[register] | self.registers[register + 1] << 8
+
+    def _setWord(self, register, value):
+        self.registers[register] = value & 0xFF
+        self.registers[register + 1] = (value >> 8) & 0xFF
+
+    def levels(self):
+        """Pin levels as the GPIO register would read them"""
+        iodir = self._word(expander.IODIRA)
+        # Inputs float high with the pull ups (and the bonnet's resistors)
+        inputs = ~self.grounded & 0xFFFF
+        outputs = self._word(expander.OLATA)
+        return (inputs & iodir) | (outputs & ~iodir & 0xFFFF)
+
+    def interruptAsserted(self):
+        return self._word(expander.INTFA) != 0
+
+    def setGrounded(self, pin, grounded):
+        with self._lock:
+            wasAsserted = self.interruptAsserted()
+            if grounded:
+                self.grounded |= 1 << pin
+            else:
+                self.grounded &= ~(1 << pin)
+            levels = self.levels()
+            if levels != self.lastLevels:
+                self.lastChangeAt = time.monotonic()
+            changed = (levels ^ self.lastLevels) & self._word(expander.GPINTENA)
+            self.lastLevels = levels
+            # Only the first change is captured until the interrupt is cleared
+            if changed and not self.interruptAsserted():
+                self._setWord(expander.INTFA, changed)
+                self._setWord(expander.INTCAPA, levels)
+            self._notify(wasAsserted)
+
+    def readRegisters(self, register, length):
+        with self._lock:
+            wasAsserted = self.interruptAsserted()
+            data = bytearray()
+            for offset in range(length):
+                address = (register + offset) % len(self.registers)
+                if address in (expander.GPIOA, expander.GPIOA + 1):
+                    data.append(self.levels() >> (8 * (address & 1)) & 0xFF)
+                else:
+                    data.append(self.registers[address])
+                # Reading INTCAP or GPIO clears that port's interrupt
+                if expander.INTCAPA <= address <= expander.GPIOA + 1:
+                    self.registers[expander.INTFA + (address & 1)] = 0
+            self._notify(wasAsserted)
+            return bytes(data)
+
+    def writeRegisters(self, register, data):
+        with self._lock:
+            for offset, value in enumerate(data):
+                address = (register + offset) % len(self.registers)
+                if address in (expander.INTFA, expander.INTFA + 1,
+                               expander.INTCAPA, expander.INTCAPA + 1):
+                    continue  # read only
+                if address in (expander.GPIOA, expander.GPIOA + 1):
+                    # Writing GPIO writes the latch
+                    address += expander.OLATA - expander.GPIOA
+                if address in (expander.IOCON, expander.IOCON + 1):
+                    # One register at two addresses
+                    self.registers[expander.IOCON] = value
+                    self.registers[expander.IOCON + 1] = value
+                    continue
+                self.registers[address] = value
+            self.lastLevels = self.levels()
+
+    def _notify(self, wasAsserted):
+        asserted = self.interruptAsserted()
+        if asserted != wasAsserted and self._onInterruptChange:
+            self._onInterruptChange(asserted)
+
+
+class SimulatedInterruptLine:
+    """Stands in for RPi.GPIO edge detection on the INT pin.
+
+    Callbacks run on one dispatch thread, both edges, with the same
+    bouncetime filtering as add_event_detect.
+    """
+
+    def __init__(self, channel=17, bouncetime=50):
+        self.channel = channel
+        self.bouncetime = bouncetime
+        self._asserted = False
+        self._callback = None
+        self._lastEdge = None
+        self._edges = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def drive(self, asserted):
+        """Called by the chip when its INT output changes"""
+        self._asserted = asserted
+        self._edges.put(time.monotonic())
+
+    def attach(self, callback):
+        self._callback = callback
+
+    def isAsserted(self):
+        return self._asserted
+
+    def close(self):
+        # The dispatch thread stays up so the line can be attached again
+        self._callback = None
+
+    def _run(self):
+        while True:
+            edgeTime = self._edges.get()
+            if edgeTime is None:
+                break
+            if (self._lastEdge is not None and
+                    (edgeTime - self._lastEdge) * 1000 < self.bouncetime):
+                continue
+            self._lastEdge = edgeTime
+            callback = self._callback
+            if callback is not None:
+                callback(self.channel)
+
+
+class SimulatedBackend(hardware.IoBackend):
+    """Every expander and INT line in the wiring, in software"""
+
+    def __init__(self, wiring, latencyMs=0.4, bouncetime=50):
+        self.bus = SimulatedBus(latencyMs)
+        self._lineLock = threading.Lock()
+        lines = {pin: SimulatedInterruptLine(pin, bouncetime)
+                 for pin in wiring.chipsOnLine()}
+        inputChips = [
+            SimulatedMcp23017(self.bus, lambda asserted, pin=pin: self._lineChanged(pin))
+            for pin in wiring.interruptPins]
+        ledChips = [SimulatedMcp23017(self.bus) for _ in wiring.ledAddresses]
+        super().__init__(wiring, inputChips, ledChips, lines)
+
+    def _lineChanged(self, channel):
+        # Open drain: the line is low while any chip on it is asserting
+        with self._lineLock:
+            asserted = any(self.inputChips[chip].interruptAsserted()
+                           for chip in self.chipsOnLine(channel))
+            line = self.interruptLines[channel]
+            if asserted != line.isAsserted():
+                line.drive(asserted)
+
+    # -- Driving the simulated board, from any thread --
+    # Pins are bits of the wide port word, see wiring.py
+
+    def _chip(self, pin):
+        return self.inputChips[pin // PINS_PER_CHIP], pin % PINS_PER_CHIP
+
+    def plug(self, pin, bounces=0, bounceMs=2):
+        """Plug a jack in, optionally with contact bounce first"""
+        self._settle(pin, True, bounces, bounceMs)
+
+    def unplug(self, pin, bounces=0, bounceMs=2):
+        self._settle(pin, False, bounces, bounceMs)
+
+    def isPlugged(self, pin):
+        chip, chipPin = self._chip(pin)
+        return bool(chip.grounded >> chipPin & 1)
+
+    def toggle(self, pin, bounces=0):
+        if self.isPlugged(pin):
+            self.unplug(pin, bounces)
+        else:
+            self.plug(pin, bounces)
+
+    def press(self, pin, holdMs=100):
+        """Press and release one of the buttons"""
+        chip, chipPin = self._chip(pin)
+        chip.setGrounded(chipPin, True)
+        threading.Timer(holdMs / 1000,
+            chip.setGrounded, (chipPin, False)).start()
+
+    def wedge(self):
+        """Hang the bus, as a chip stuck mid-byte would"""
+        self.bus.wedged = True
+
+    def clockBusFree(self):
+        self.bus.wedged = False
+
+    def lastInputChange(self):
+        changes = [chip.lastChangeAt for chip in self.inputChips
+                   if chip.lastChangeAt is not None]
+        return max(changes, default=None)
+
+    def ledsOn(self):
+        """Wide word of lit LED outputs"""
+        word = 0
+        for index, chip in enumerate(self.ledChips):
+            outputs = ~self.wiring.ledDirection(index)
+            word = setChipWord(word, index, chip._word(expander.OLATA) & outputs)
+        return word
+
+    def _settle(self, pin, grounded, bounces, bounceMs):
+        chip, chipPin = self._chip(pin)
+        # Chatter between the two states, ending on the requested one
+        for i in range(bounces * 2):
+            chip.setGrounded(chipPin, grounded if i % 2 == 0 else not grounded)
+            time.sleep(bounceMs / 1000)
+        chip.setGrounded(chipPin, grounded)
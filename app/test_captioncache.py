@@ -0,0 +1,51 @@
+"""Round trip of the caption cache against the captions in the repo.
+
+    python -m unittest test_captioncache
+
+Run from the app directory, like control.py.
+"""
+import os
+import tempfile
+import unittest
+
+from captions import CaptionLibrary
+
+CAPTION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'captions')
+
+
+def contents(library):
+    return {name: (list(index.starts), list(index.ends),
+                   [index.texts[cue] for cue in range(len(index))])
+            for name, index in library._clips.items()}
+
+
+class CaptionCacheTest(unittest.TestCase):
+    def test_mapped_matches_compiled(self):
+        compiled = CaptionLibrary(CAPTION_DIR)
+        with tempfile.TemporaryDirectory() as tmp:
+            cachePath = os.path.join(tmp, 'captions.cache')
+            written = CaptionLibrary(CAPTION_DIR, cachePath)
+            self.assertFalse(written.fromCache)
+            mapped = CaptionLibrary(CAPTION_DIR, cachePath)
+            self.assertTrue(mapped.fromCache)
+            self.assertEqual(contents(mapped), contents(compiled))
+
+    def test_changed_source_compiles_again(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            captionDir = os.path.join(tmp, 'captions')
+            os.makedirs(os.path.join(captionDir, 'hello'))
+            path = os.path.join(captionDir, 'hello', 'clip.srt')
+            with open(path, 'w') as f:
+                f.write("1\n00:00:00,000 --> 00:00:01,000\nOne\n")
+            cachePath = os.path.join(tmp, 'captions.cache')
+            CaptionLibrary(captionDir, cachePath)
+            with open(path, 'w') as f:
+                f.write("1\n00:00:00,000 --> 00:00:02,000\nTwo words\n")
+            os.utime(path, ns=(0, 0))
+            library = CaptionLibrary(captionDir, cachePath)
+            self.assertFalse(library.fromCache)
+            self.assertEqual(library.get('hello', 'clip').texts[0], 'Two words')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""libVLC audio engine: one instance, a media player per channel"""
+import queue
+import threading
+
+import vlc
+
+from audio import AudioEngine, Channel, rssKb
+from media import MediaCache
+
+
+class VlcChannel(Channel):
+    """End and playing handlers are attached once, for the player's life.
+
+    libVLC 3 sends EndReached from the input thread, and set_media() and
+    stop() join that thread, so once either returns no end of the old
+    clip can still be on its way. The token is only moved on after them:
+    an end that races a new play() is read with the old token and dropped
+    as stale.
+    """
+
+    def __init__(self, player, media, resumeLater):
+        super().__init__()
+        self.player = player
+        self._media = media
+        self._resumeLater = resumeLater
+        # python-vlc keeps the callbacks on this wrapper, so it has to live
+        # as long as the player
+        self._events = player.event_manager()
+        self._events.event_attach(vlc.EventType.MediaPlayerEndReached, self._endReached)
+        self._events.event_attach(vlc.EventType.MediaPlayerPlaying, self._playing)
+
+    def _endReached(self, event):
+        self._ended(event, self.token)
+
+    def _resumeChain(self, chain):
+        # libVLC isn't reentrant from its own event callbacks
+        self._resumeLater(chain)
+
+    def load(self, name):
+        self.clip = name
+        self.player.set_media(self._media.get(name))
+
+    def play(self, then=None, chain=None):
+        self._begin(then, chain)
+        self.paused = False
+        self.player.play()
+
+    def cue(self, name):
+        # A copy, so the option doesn't stick to the cached media
+        media = self._media.get(name).duplicate()
+        media.add_option(':start-paused')
+        self.clip = name
+        self.player.set_media(media)
+        self._begin()
+        self.paused = True
+        self.player.play()
+
+    def resume(self, then=None):
+        if then is not None:
+            self.then = then
+        if self.paused:
+            self.paused = False
+            self.player.set_pause(0)
+
+    def stop(self):
+        self.player.stop()
+        self._begin()
+        self.paused = False
+
+    def timeMs(self):
+        return self.player.get_time()
+
+
+class VlcEngine(AudioEngine):
+    """Shared libVLC instance, media cache and a player per channel.
+
+    Loading the plugin cache and opening an audio output is done once
+    for the process instead of once per vlc.Instance. What that costs is
+    kept in instanceKb, and per player in playerKb.
+
+    A clip chained after one that ended is resumed on the engine's own
+    thread, as the end arrives in a libVLC callback that mustn't call
+    back into libVLC.
+    """
+    name = 'vlc'
+
+    def __init__(self, audioDir, names=(), instanceArgs=()):
+        super().__init__()
+        rssBefore = rssKb()
+        self.instance = vlc.Instance(*instanceArgs)
+        self.instanceKb = rssKb() - rssBefore
+        self.media = MediaCache(self.instance, audioDir, names)
+        self.playerKb = {}
+        self._resumes = queue.Queue()
+        self._resumer = threading.Thread(target=self._runResumes, name='vlc-chain', daemon=True)
+        self._resumer.start()
+        self._addChannels(self._newChannel)
+
+    def _newChannel(self, role):
+        rssBefore = rssKb()
+        channel = VlcChannel(self.instance.media_player_new(), self.media, self._resumeLater)
+        self.playerKb.setdefault(role, []).append(rssKb() - rssBefore)
+        return channel
+
+    def _resumeLater(self, chain):
+        """libVLC's thread. The token is the cued clip's, so a chain that's
+        been stopped or cued again by the time it's run is left alone."""
+        self._resumes.put((chain, chain.token))
+
+    def _runResumes(self):
+        while True:
+            chain, token = self._resumes.get()
+            if chain is None:
+                return
+            if chain.token == token:
+                chain.resume()
+
+    def close(self):
+        super().close()
+        self._resumes.put((None, None))
+        self._resumer.join()
+
+    def summary(self):
+        playerKb = ", ".join(f"{role} {sizes}" for role, sizes in self.playerKb.items())
+        return (f"{super().summary()}\n"
+                f"-- libVLC: RSS instance {self.instanceKb} kB, players (kB) {playerKb} --\n"
+                f"{self.media.summary()}")
@@ -0,0 +1,102 @@
+"""Which expander pin each jack, LED and button is on.
+
+Read from wiring.json (settings.WIRING_FILE). Input and LED expanders
+are numbered in the order they're listed. Port words span all the chips
+of a kind: chip k holds bits 16k to 16k + 15, so "bit" below always means
+a position in that wide word.
+"""
+import json
+
+PINS_PER_CHIP = 16
+CHIP_MASK = (1 << PINS_PER_CHIP) - 1
+
+
+def bit(chip, pin):
+    return chip * PINS_PER_CHIP + pin
+
+
+def chipWord(word, chip):
+    """The 16 bits of a wide port word that belong to one chip"""
+    return word >> (chip * PINS_PER_CHIP) & CHIP_MASK
+
+
+def setChipWord(word, chip, value):
+    shift = chip * PINS_PER_CHIP
+    return word & ~(CHIP_MASK << shift) | (value & CHIP_MASK) << shift
+
+
+def chipsIn(mask):
+    """Chips with any bit set in mask"""
+    chips = []
+    chip = 0
+    while mask:
+        if mask & CHIP_MASK:
+            chips.append(chip)
+        mask >>= PINS_PER_CHIP
+        chip += 1
+    return chips
+
+
+class Wiring:
+    """Person <-> jack and person <-> LED, built once from the config"""
+
+    def __init__(self, config):
+        self.inputAddresses = [int(c["address"], 0) for c in config["inputChips"]]
+        self.interruptPins = [c["interruptPin"] for c in config["inputChips"]]
+        self.ledAddresses = [int(c["address"], 0) for c in config["ledChips"]]
+        self.stopBit = self._inputBit(config["stopButton"])
+        self.startBit = self._inputBit(config["startButton"])
+
+        # person -> bit and back
+        self.jackBit = {}
+        self.personAt = {}
+        self.ledBit = {}
+        for jack in config["jacks"]:
+            person = jack["person"]
+            inputBit = self._inputBit(jack)
+            if inputBit in self.personAt or inputBit in (self.stopBit, self.startBit):
+                raise ValueError(f"Input chip {jack['chip']} pin {jack['pin']} wired twice")
+            self.jackBit[person] = inputBit
+            self.personAt[inputBit] = person
+            if "ledChip" in jack:
+                if not 0 <= jack["ledChip"] < len(self.ledAddresses):
+                    raise ValueError(f"No LED chip {jack['ledChip']}")
+                self.ledBit[person] = bit(jack["ledChip"], jack["ledPin"])
+        if len(set(self.ledBit.values())) != len(self.ledBit):
+            raise ValueError("Two jacks share an LED pin")
+
+        self.persons = sorted(self.jackBit)
+        self.jackMask = sum(1 << b for b in self.personAt)
+        self.inputWidth = PINS_PER_CHIP * len(self.inputAddresses)
+        # Pulled up, nothing plugged in
+        self.allHigh = (1 << self.inputWidth) - 1
+
+    def _inputBit(self, entry):
+        if not 0 <= entry["chip"] < len(self.inputAddresses):
+            raise ValueError(f"No input chip {entry['chip']}")
+        return bit(entry["chip"], entry["pin"])
+
+    def ledDirection(self, chip):
+        """IODIR for an LED chip: wired LED pins are outputs, the rest inputs"""
+        outputs = 0
+        for ledBit in self.ledBit.values():
+            if ledBit // PINS_PER_CHIP == chip:
+                outputs |= 1 << (ledBit % PINS_PER_CHIP)
+        return ~outputs & CHIP_MASK
+
+    def chipsOnLine(self):
+        """interrupt pin -> input chips wired to it (open drain lines can be shared)"""
+        lines = {}
+        for chip, pin in enumerate(self.interruptPins):
+            lines.setdefault(pin, []).append(chip)
+        return lines
+
+    def jackBits(self, pinsIn):
+        """Input bit for each entry of a per-person list like model.pinsIn,
+        None for people without a jack"""
+        return [self.jackBit.get(person) for person in range(len(pinsIn))]
+
+
+def load(path):
+    with open(path) as f:
+        return Wiring(json.load(f))